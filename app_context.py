@@ -11,11 +11,13 @@ Description: Handles context variables and function to generate UI
 import tkinter as tk # UI
 from tkinter import ttk, font # UI
 import webbrowser # open links in standard browser
+from backup_settings import BackupSettings # backup options shared with the command line
 from i18n import _
 
-class AppContext():
+class AppContext(BackupSettings):
   """ Handles context variables and UI functions """
   def __init__(self):
+    super().__init__() # backup options
     self._ui_defaults = {
       "font_family": "Segoe UI",
       "geometry": "900x800",
@@ -25,11 +27,10 @@ class AppContext():
     for key, value in self._ui_defaults.items():
       setattr(self, key, value)
 
-    self.backup_input = [] # folders to backup
-    self.backup_output = None # where to put a backup
     self.source_size = 0
     self.source_size_human = "0 B"
-    self.compress = False
+    self.powershell_installed = None # None until the background probe finishes
+    self.folder_sizer = None # background folder sizing, its cache outlives the backup screen
     self.source_size_label = None
     self.report_label = None
     self.error_label = None
@@ -49,6 +50,7 @@ class AppContext():
     self.progress_frame = None
     self.scrollable_frame = None
     self.progress = None
+    self.progress_label = None
     self.view_btn = None
     self.btn_novice_mode = None
     self.btn_expert_mode = None
@@ -81,11 +83,28 @@ class AppContext():
     self.progress.pack(pady=10)
     self.progress.start()
 
+  def update_progress(self, fraction, text):
+    """Switch the progressbar to byte-accurate mode and show the progress details"""
+    if getattr(self, "progress", None) is None:
+      return # progress was stopped meanwhile
+    if self.progress.cget("mode") != "determinate":
+      self.progress.stop()
+      self.progress.config(mode="determinate", maximum=100, length=400)
+    self.progress["value"] = fraction * 100
+    if getattr(self, "progress_label", None):
+      self.progress_label.config(text=text)
+    else:
+      self.progress_label = ttk.Label(self.progress_frame, text=text, justify="left", wraplength=800)
+      self.progress_label.pack()
+
   def stop_progress(self):
     """Stop progressbar"""
     self.progress.stop()
     self.progress.pack_forget()
-    del self.progress
+    self.progress = None
+    if getattr(self, "progress_label", None):
+      self.progress_label.destroy()
+      self.progress_label = None
 
   def quit_button(self):
     """Create Quit button"""
@@ -141,6 +160,7 @@ class AppContext():
     def update_wrap(event):
       label.config(wraplength=event.width)
     label.bind('<Configure>', update_wrap)
+    return label
 
   def get_status(self, step_index):
     """ Display current step """
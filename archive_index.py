@@ -0,0 +1,118 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: archive_index.py
+Description: Member index written along with an archive, listing and extracting single members by seeking
+'''
+
+import json
+import bisect
+import tarfile
+import contextlib
+from volumes import VolumeReader, find_volumes
+from compression import decompressed_reader, MAGIC_SIZE
+from member_codec import original_name, original_size, extract_member
+
+INDEX_SUFFIX = ".idx" # backup_<ts>.tar.bz2.idx
+SEEK_GAP = 16 * 1024 * 1024 # read through gaps up to this size instead of seeking again
+_SKIP_SIZE = 1024 * 1024
+
+class IndexWriter():
+  """
+  Writes index lines while the archive is created:
+  M <header offset> <size> <type> <json name> for members (original name and size of compressed files),
+  B <uncompressed start> <compressed start> for compressed blocks
+  """
+  def __init__(self, fileobj):
+    self.fileobj = fileobj
+
+  def member(self, offset, info):
+    """Record the offset of a member header in the uncompressed tar stream"""
+    self.fileobj.write(
+      f"M\t{offset}\t{original_size(info)}\t{info.type.decode('ascii')}\t{json.dumps(original_name(info))}\n")
+
+  def block(self, uncompressed_start, compressed_start):
+    """Record where a compressed block starts, called by ParallelBlockWriter"""
+    self.fileobj.write(f"B\t{uncompressed_start}\t{compressed_start}\n")
+
+class ArchiveIndex():
+  """Random access to an archive through its index: list members, extract files or subtrees"""
+  def __init__(self, archive_path, index_path=None):
+    self.archive_path = archive_path
+    self.index_path = index_path or archive_path + INDEX_SUFFIX
+    self.members = {} # name -> (offset, size, type)
+    self.block_starts = [] # uncompressed starts of compressed blocks, sorted
+    self.block_offsets = {} # uncompressed start -> compressed start
+
+  def load(self):
+    """Read the index, a later line for the same member wins like a later tar member"""
+    with open(self.index_path, "r", encoding="utf-8") as f:
+      for line in f:
+        fields = line.rstrip("\n").split("\t")
+        if fields[0] == "M" and len(fields) == 5:
+          self.members[json.loads(fields[4])] = (int(fields[1]), int(fields[2]), fields[3])
+        elif fields[0] == "B" and len(fields) == 3:
+          self.block_offsets[int(fields[1])] = int(fields[2])
+    self.block_starts = sorted(self.block_offsets)
+    return self
+
+  def list(self, prefix=""):
+    """(name, size, type) of the members at or below prefix, sorted by name"""
+    return [(name, size, member_type) for name, (_, size, member_type) in sorted(self.members.items())
+            if self.is_under(name, prefix)]
+
+  def is_under(self, name, prefix):
+    """Check if a member is the prefix itself or inside of it"""
+    prefix = prefix.rstrip("/")
+    return not prefix or name == prefix or name.startswith(prefix + "/")
+
+  @contextlib.contextmanager
+  def open_at(self, offset):
+    """Sequential tarfile reading from the member header at offset, decompressing from the nearest block"""
+    with VolumeReader(find_volumes(self.archive_path) or [self.archive_path]) as raw:
+      if self.block_starts:
+        start = self.block_starts[bisect.bisect_right(self.block_starts, offset) - 1]
+        raw.seek(self.block_offsets[start])
+        magic = raw.read(MAGIC_SIZE)
+        raw.seek(self.block_offsets[start])
+        stream = decompressed_reader(raw, magic)
+        skip = offset - start
+        while skip > 0:
+          data = stream.read(min(skip, _SKIP_SIZE))
+          if not data:
+            raise tarfile.ReadError(f"archive ends before offset {offset}")
+          skip -= len(data)
+      else:
+        raw.seek(offset)
+        stream = raw
+      with tarfile.open(fileobj=stream, mode="r|") as tar:
+        yield tar
+
+  def extract(self, prefix, target):
+    """Extract the members at or below prefix into target, return their names"""
+    wanted = sorted((self.members[name][0], name) for name, _, _ in self.list(prefix))
+    done = 0
+    while done < len(wanted):
+      base = wanted[done][0]
+      with self.open_at(base) as tar:
+        for member in tar:
+          offset = base + member.offset
+          if offset < wanted[done][0]:
+            continue
+          if offset > wanted[done][0]: # index and archive disagree
+            raise tarfile.ReadError(f"no member at offset {wanted[done][0]}")
+          extract_member(tar, member, target)
+          done += 1
+          if done == len(wanted) or wanted[done][0] - offset > SEEK_GAP:
+            break
+        else:
+          if done < len(wanted):
+            raise tarfile.ReadError(f"no member at offset {wanted[done][0]}")
+    return [name for _, name in wanted]
+
+def extract_from_index(archive_path, prefix, target):
+  """Extract one file or folder from an archive without reading it from the start"""
+  return ArchiveIndex(archive_path).load().extract(prefix, target)
@@ -0,0 +1,142 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: archiver.py
+Description: Writes scanned manifests into a tar archive without walking the source folders again
+'''
+
+import os
+import io
+import hashlib
+import stat
+import time
+import tarfile
+import logging
+import tempfile
+from scanner import TYPE_DIR, TYPE_LINK
+from progress import CountingReader
+from throttle import ControlledReader
+from member_codec import should_compress, mark_compressed
+from i18n import _
+
+SPOOL_MEMORY = 32 * 1024 * 1024 # compressed members larger than this are spooled to a temporary file
+
+class PaddedReader():
+  """Reads exactly the size written to the tar header, zero-padding a file that shrank meanwhile"""
+  def __init__(self, fileobj, size, path):
+    self.fileobj = fileobj
+    self.remaining = size
+    self.path = path
+
+  def read(self, size=-1):
+    """Read from the file, never past the header size and never less than asked"""
+    if size < 0 or size > self.remaining:
+      size = self.remaining
+    data = self.fileobj.read(size)
+    if len(data) < size:
+      logging.warning("%s %s", _("File shrank while reading, padding with zeros:"), self.path)
+      data += bytes(size - len(data))
+    self.remaining -= size
+    return data
+
+class HashingReader():
+  """Computes the SHA-256 of the data while it is read into the archive, no second read pass"""
+  def __init__(self, fileobj):
+    self.fileobj = fileobj
+    self.sha256 = hashlib.sha256()
+
+  def read(self, size=-1):
+    """Read and hash"""
+    data = self.fileobj.read(size)
+    self.sha256.update(data)
+    return data
+
+class Archiver():
+  """Adds manifest entries to an open tarfile.TarFile"""
+  def __init__(self, tar, progress=None, checksum_file=None, index_writer=None, compressor=None, control=None):
+    self.tar = tar
+    self.progress = progress # ProgressTracker fed by file reads
+    self.checksum_file = checksum_file # text file, gets a sha256sum line for every archived file
+    self.index_writer = index_writer # IndexWriter, gets the header offset of every member
+    self.compressor = compressor # MemberCompressor for per-file compression in a plain tar
+    self.control = control # BackupControl: pause, cancel and bandwidth limit between reads
+    self.failed_paths = set() # entries that could not be archived
+
+  def add_manifest(self, manifest):
+    """Add every entry of a manifest, skipping the ones that can't be read"""
+    self.add_entries(manifest, manifest.entries)
+
+  def add_entries(self, manifest, entries, on_entry=None):
+    """Add selected entries of a manifest, skipping the ones that can't be read; on_entry(entry) follows each one"""
+    for path, e in manifest.errors:
+      logging.error("%s %s: %s", _("Skipping"), path, e)
+    for entry in entries:
+      if self.control is not None:
+        self.control.check()
+      path = manifest.path(entry.rel)
+      try:
+        self.add_entry(entry, path, manifest.arcname_of(entry.rel))
+      except (PermissionError, FileNotFoundError) as e:
+        self.failed_paths.add(path)
+        logging.error("%s %s: %s", _("Skipping"), path, e)
+      if on_entry is not None:
+        on_entry(entry)
+
+  def add_entry(self, entry, path, arcname):
+    """Add one entry, building the header from the manifest instead of a new stat call"""
+    info = tarfile.TarInfo(arcname)
+    info.mtime = entry.mtime
+    info.mode = stat.S_IMODE(entry.mode)
+    if entry.type == TYPE_DIR:
+      info.type = tarfile.DIRTYPE
+      self.addfile(info)
+    elif entry.type == TYPE_LINK:
+      info.type = tarfile.SYMTYPE
+      info.linkname = os.readlink(path)
+      self.addfile(info)
+    else:
+      with open(path, "rb") as f:
+        # size from the open handle: the file may have changed since the scan
+        st = os.fstat(f.fileno())
+        info.size = st.st_size
+        info.mtime = st.st_mtime
+        reader = f
+        if self.progress is not None:
+          self.progress.set_file(path)
+          reader = CountingReader(f, self.progress)
+        if self.control is not None:
+          reader = ControlledReader(reader, self.control)
+        compress = self.compressor is not None and should_compress(arcname, info.size, f)
+        reader = HashingReader(PaddedReader(reader, info.size, path))
+        if compress:
+          self.addcompressed(info, reader)
+        else:
+          self.addfile(info, reader)
+        if self.checksum_file is not None:
+          self.checksum_file.write(f"{reader.sha256.hexdigest()}  {arcname}\n")
+
+  def add_bytes(self, arcname, data):
+    """Add an in-memory file, used for LMTK metadata members"""
+    info = tarfile.TarInfo(arcname)
+    info.size = len(data)
+    info.mtime = time.time()
+    self.addfile(info, io.BytesIO(data))
+
+  def addcompressed(self, info, reader):
+    """Write a file as a separately compressed member, its size is only known after compressing"""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY) as spool:
+      self.compressor.compress(reader, spool)
+      mark_compressed(info, info.size, self.compressor.codec)
+      info.size = spool.tell()
+      spool.seek(0)
+      self.addfile(info, spool)
+
+  def addfile(self, info, fileobj=None):
+    """Write a member and record where its header starts"""
+    offset = self.tar.offset
+    self.tar.addfile(info, fileobj)
+    if self.index_writer is not None:
+      self.index_writer.member(offset, info)
@@ -5,22 +5,32 @@
 
 '''
 Module: backup.py
-Description: Works with files, creates tar/tar.bz2 archive
+Description: Backup screen of the UI, the work is done by backup_engine.py
 '''
 
-import subprocess # execute PowerShell script for user folder detection
 from tkinter import ttk, filedialog
 import os
-import threading
 import tarfile
+import threading
 import datetime
 import logging
+import powershell # user folder detection
 from app_context import AppContext
+from backup_engine import BackupEngine
+from throttle import BackupControl, BackupCancelled, lower_thread_priority
+from sizing import FolderSizer
 from i18n import _
 
 class Backup():
-  """Creates backup in tar/tar.bz2 format"""
+  """Backup screen: source and destination folders, sizing, progress and controls of the backup engine"""
   def __init__(self, context: AppContext):
+    self.engine = BackupEngine(context,
+      on_progress=lambda info: context.root.after(0,
+        lambda: context.update_progress(info["fraction"], self.progress_text(info))),
+      on_status=lambda text: context.root.after(0, lambda: context.update_progress(0, text)))
+    self.control_frame = None
+    if context.folder_sizer is None:
+      context.folder_sizer = FolderSizer(self.engine.scanner)
     context.scrollable_frame = ttk.Frame(context.root)
     context.scrollable_frame.pack(padx=10, pady=10)
     if context.backup_output is None:
@@ -39,16 +49,15 @@ class Backup():
       [Environment]::GetFolderPath("Desktop")
       (Get-ItemProperty 'HKCU:\Software\Microsoft\Windows\CurrentVersion\Explorer\Shell Folders').'{374DE290-123F-4565-9164-39C4925E467B}'
     )
-    $folders -join "`n"
+    $folders
     '''
 
-    result = subprocess.run(
-      ["powershell", "-NoProfile", "-Command", ps_script],
-      capture_output=True,
-      text=True,
-      check=True
-    )
-    return result.stdout.strip().splitlines()
+    try:
+      folders = powershell.run(ps_script)
+    except powershell.PowerShellError as e:
+      logging.error("%s: %s", _("Can't list the default folders"), e)
+      return [] # the user adds folders by hand
+    return [folder for folder in folders if folder]
 
   def add_folder(self, context: AppContext):
     """Add a source folder for a backup - open a file dialog"""
@@ -59,16 +68,58 @@ class Backup():
       self.display_folder(context.backup_input[-1], context)
 
   def add_folder_backend(self, folder, context: AppContext):
-    """Add a source folder for a backup - add a folder to an array, recalculate total size"""
-    folder_size = self.get_folder_size(folder)
-    folder_info = {
-      "path": folder,
-      "size_bytes": folder_size,
-      "size_human": self.get_size_hr(folder_size)
-      }
+    """Add a source folder for a backup - add a folder to an array, size it in the background"""
+    folder_info = self.engine.folder_info(folder)
     context.backup_input.append(folder_info)
-    context.source_size += folder_size
+    self.start_sizing(folder_info, context)
+    self.update_total_size(context)
+
+  def start_sizing(self, folder_info, context: AppContext):
+    """Size a folder on the background sizer with the current exclusion rules"""
+    folder_info["cancel"] = context.folder_sizer.size(folder_info["path"], self.engine.folder_arcname(folder_info["path"]),
+      self.engine.exclusion_rules().compile(),
+      on_progress=lambda manifest: context.root.after(0,
+        lambda size=manifest.total_size: self.set_folder_size(folder_info, size, context)),
+      on_done=lambda manifest: context.root.after(0,
+        lambda: self.set_folder_size(folder_info, manifest.total_size, context, manifest)))
+
+  def resize_folders(self, context: AppContext):
+    """Size all folders again after the exclusion rules changed"""
+    for folder_info in context.backup_input:
+      folder_info["cancel"].set()
+      folder_info["manifest"] = None
+      folder_info["size_human"] = _("calculating…")
+      self.show_folder_size(folder_info)
+      self.start_sizing(folder_info, context)
+    self.update_total_size(context)
+
+  def set_folder_size(self, folder_info, size, context: AppContext, manifest=None):
+    """Show a partial or, with its manifest, the final size of a folder"""
+    if folder_info not in context.backup_input:
+      return # removed meanwhile
+    folder_info["size_bytes"] = size
+    folder_info["size_human"] = self.get_size_hr(size)
+    if manifest is None:
+      folder_info["size_human"] += ", " + _("calculating…")
+    else:
+      folder_info["manifest"] = manifest
+      if manifest.excluded:
+        folder_info["size_human"] += ", " + _("{count} items excluded").format(count=manifest.excluded)
+    self.show_folder_size(folder_info)
+    self.update_total_size(context)
+
+  def show_folder_size(self, folder_info):
+    """Update the label of a folder if it is on the screen"""
+    label = folder_info.get("label")
+    if label is not None and label.winfo_exists():
+      label.config(text=f"{folder_info['path']} ({folder_info['size_human']})")
+
+  def update_total_size(self, context: AppContext):
+    """Recalculate total size of the source folders"""
+    context.source_size = sum(f["size_bytes"] for f in context.backup_input)
     context.source_size_human = self.get_size_hr(context.source_size)
+    if any(f["manifest"] is None for f in context.backup_input):
+      context.source_size_human += ", " + _("calculating…")
     context.set_source_folder_label()
 
   def set_destination(self, context: AppContext):
@@ -86,6 +137,7 @@ class Backup():
     frame.columnconfigure(0, weight=1)
     label = ttk.Label(frame, text=f"{folder['path']} ({folder['size_human']})", anchor="w", justify="left")
     label.grid(row=0, column=0, sticky="w")
+    folder["label"] = label # updated when sizing finishes
 
     remove_btn = ttk.Button(frame, text=_("Remove"), width=10,
       command=lambda: self.remove_folder(folder, frame, context))
@@ -94,121 +146,161 @@ class Backup():
   def remove_folder(self, folder, frame, context: AppContext):
     """Remove source folder from the UI and array"""
     if folder in context.backup_input:
-      context.source_size -= folder['size_bytes']
-      context.source_size_human = self.get_size_hr(context.source_size)
+      folder["cancel"].set()
       context.backup_input.remove(folder)
-      context.set_source_folder_label()
+      self.update_total_size(context)
       frame.destroy()
 
-  def get_folder_size(self, path):
-    """Calculate total source folders size"""
-    total = 0
-    for dirpath, _, filenames in os.walk(path):
-      for f in filenames:
-        try:
-          fp = os.path.join(dirpath, f)
-          total += os.path.getsize(fp)
-        except OSError:
-          pass
-    return total
-
   def get_size_hr(self, total):
     """Calculate folder size in human-readable format"""
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-      if total < 1024:
-        return f"{total:.1f} {unit}"
-      total /= 1024
-    return f"{total:.1f} PB"
+    return self.engine.get_size_hr(total)
 
   def start_backup(self, context: AppContext):
     """Perform checks on source and destination folders and call actual archive method in a thread"""
     if getattr(context, "error_label", None):
       context.error_label.destroy()
       context.error_label = None
-    error_code = self.validate_backup_paths(context)
+    error_code = self.engine.validate_backup_paths()
     if error_code == 0:
       context.start_progress()
-      threading.Thread(target=lambda: self.create_tar_archive(context), daemon=True).start()
+      context.backup_control = BackupControl(context.bandwidth_limit)
+      self.show_controls(context)
+      threading.Thread(target=lambda: self.run_backup(context), daemon=True).start()
     else:
-      error_arr = [
-        _("OK"),
-        _("No source folders selected"),
-        _("No destination folder selected"),
-        _("Destination is one of the input folders"),
-        _("One input folder is a subfolder of another input folder"),
-        _("Output is inside one of the input folders (cyclic backup)"),
-      ]
-      text = "Error: " + error_arr[error_code]
-      if getattr(context, "error_label", None):
-        context.error_label.config(text=text)
-      else:
-        context.error_label = ttk.Label(context.progress_frame, text=text, font=(context.font_family, 12))
-        context.error_label.pack()
-
-  def create_tar_archive(self, context: AppContext):
-    """Create a tar/tar.bz2 archive"""
-    if context.compress:
-      mode = "w:bz2"
-      extension = "tar.bz2"
+      self.show_path_error(context, error_code)
+
+  def show_path_error(self, context: AppContext, error_code):
+    """Show why the source and destination folders can't be used"""
+    text = self.engine.path_error(error_code)
+    if getattr(context, "error_label", None):
+      context.error_label.config(text=text)
     else:
-      mode = "w"
-      extension = "tar"
-
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_path = os.path.join(context.backup_output, f"backup_{timestamp}.{extension}")
-    log_filename = f"log_{timestamp}.txt"
-    log_path = os.path.join(context.backup_output, log_filename)
-
-    logging.basicConfig(
-      filename=log_path,
-      level=logging.INFO,
-      format='%(asctime)s - %(levelname)s - %(message)s',
-      filemode='w'  # overwrite if re-run
-    )
+      context.error_label = ttk.Label(context.progress_frame, text=text, font=(context.font_family, 12))
+      context.error_label.pack()
 
-    with tarfile.open(output_path, mode) as tar:
-      for folder_info in context.backup_input:
-        base_path = os.path.normpath(folder_info["path"])
-        arcname = os.path.basename(base_path.rstrip("\\/"))
+  def run_backup(self, context: AppContext):
+    """Backup thread: run the backup at the chosen priority, report the end on the UI thread"""
+    if context.low_priority:
+      lower_thread_priority()
+    try:
+      result = self.engine.run()
+    except BackupCancelled:
+      logging.info(_("Backup cancelled"))
+      context.root.after(0, lambda: self.after_cancel(context))
+    except (OSError, tarfile.TarError) as e: # a full disk, an unreadable volume, a missing codec
+      logging.error("%s %s", _("Backup failed:"), e)
+      context.root.after(0, lambda e=e: self.after_error(context, e))
+    else:
+      context.root.after(0, lambda: self.after_backup(context, result["text"]))
 
-        try:
-          tar.add(base_path, arcname=arcname)
-        except (PermissionError, FileNotFoundError) as e:
-          logging.error("%s %s: %s", _("Skipping"), base_path, e)
+  def show_controls(self, context: AppContext):
+    """Pause/Resume and Cancel buttons under the progress bar"""
+    self.control_frame = ttk.Frame(context.progress_frame)
+    self.control_frame.pack(pady=5)
+    pause_btn = ttk.Button(self.control_frame, text=_("Pause"), width=15)
+    pause_btn.config(command=lambda: self.toggle_pause(context, pause_btn))
+    pause_btn.grid(row=0, column=0, padx=5)
+    cancel_btn = ttk.Button(self.control_frame, text=_("Cancel"), width=15)
+    cancel_btn.config(command=lambda: self.cancel_backup(context, pause_btn, cancel_btn))
+    cancel_btn.grid(row=0, column=1, padx=5)
 
-    context.root.after(0, lambda: self.after_backup(context))
+  def hide_controls(self):
+    """Remove the backup controls"""
+    if self.control_frame is not None:
+      self.control_frame.destroy()
+      self.control_frame = None
 
-  def after_backup(self, context: AppContext):
+  def toggle_pause(self, context: AppContext, button):
+    """Pause a running backup or resume a paused one"""
+    if context.backup_control.paused:
+      context.backup_control.resume()
+      button.config(text=_("Pause"))
+    else:
+      context.backup_control.pause()
+      button.config(text=_("Resume"))
+
+  def cancel_backup(self, context: AppContext, *buttons):
+    """Stop the backup, the backup thread removes what it has written"""
+    context.backup_control.cancel()
+    for button in buttons:
+      button.config(state="disabled")
+
+  def after_cancel(self, context: AppContext):
+    """Stop the progress and tell that nothing was left behind"""
+    context.stop_progress()
+    self.hide_controls()
+    ttk.Label(context.progress_frame, text=_("Backup cancelled, the unfinished archive was removed"),
+      font=(context.font_family, 12)).pack()
+
+  def after_error(self, context: AppContext, error):
+    """Stop the progress and show why the backup failed"""
+    context.stop_progress()
+    self.hide_controls()
+    ttk.Label(context.progress_frame, text=_("Backup failed:") + " " + str(error),
+      font=(context.font_family, 12)).pack()
+
+  def estimate(self, context: AppContext):
+    """Dry run: estimate the archive size and duration for every codec in a thread"""
+    if getattr(context, "error_label", None):
+      context.error_label.destroy()
+      context.error_label = None
+    error_code = self.engine.validate_backup_paths()
+    if error_code != 0:
+      self.show_path_error(context, error_code)
+      return
+    context.start_progress()
+    threading.Thread(target=lambda: self.estimate_thread(context), daemon=True).start()
+
+  def estimate_thread(self, context: AppContext):
+    """Sample the sources and show what a backup with the current settings would take"""
+    try:
+      text = self.engine.estimate_text(self.engine.estimate())
+    except OSError as e:
+      text = _("Estimate failed: ") + str(e)
+    context.root.after(0, lambda: self.after_estimate(context, text))
+
+  def after_estimate(self, context: AppContext, text):
+    """Stop the progress and show the estimate"""
+    context.stop_progress()
+    ttk.Label(context.progress_frame, text=text, font=(context.font_family, 11), justify="left").pack()
+
+  def progress_text(self, info):
+    """Bytes done, throughput, ETA and the current file in human-readable form"""
+    if info["eta"] is None:
+      eta = "--:--:--"
+    else:
+      eta = str(datetime.timedelta(seconds=int(info["eta"])))
+    return (
+      f"{self.get_size_hr(info['done'])} / {self.get_size_hr(info['total'])} ({info['fraction']:.0%}), "
+      f"{info['rate'] / (1024 * 1024):.1f} MB/s, {_('ETA')} {eta}\n{info['current_file']}"
+    )
+
+  def after_backup(self, context: AppContext, details=None):
     """Stop the progress and add a message in the UI that backup is complete"""
     context.stop_progress()
+    self.hide_controls()
     finished_label = ttk.Label(context.progress_frame, text=_("Backup complete, see log file for details"), font=(context.font_family, 12))
     finished_label.pack()
+    if details:
+      ttk.Label(context.progress_frame, text=details, font=(context.font_family, 11)).pack()
 
-  def validate_backup_paths(self, context):
-    """Check for source/destination errors"""
-    input_paths = [(folder["path"]) for folder in context.backup_input]
-    output_path = context.backup_output if context.backup_output else None
-    # 1. No source folders selected
-    if not input_paths:
-      return 1
-
-    # 2. No destination folder selected
-    if not output_path:
-      return 2
-
-    # 3. Output is one of the input folders
-    if output_path in input_paths:
-      return 3
-
-    # 4. One input folder is a subfolder of another input folder
-    for i, path1 in enumerate(input_paths):
-      for j, path2 in enumerate(input_paths):
-        if i != j and path1.startswith(path2 + os.sep):
-          return 4
-
-    # 5. Output is inside one of the input folders (cyclic backup)
-    for source in input_paths:
-      if output_path.startswith(source + os.sep):
-        return 5
-
-    return 0
+  def verify(self, context: AppContext):
+    """Choose an archive and check it against its checksum manifest in a thread"""
+    archive_path = filedialog.askopenfilename(
+      initialdir=context.backup_output,
+      filetypes=[(_("LMTK archives"), "*.tar *.tar.bz2 *.tar.xz *.tar.zst *.tar.lz4 *.001"), (_("All files"), "*.*")]
+    )
+    if not archive_path:
+      return
+    context.start_progress()
+    threading.Thread(target=lambda: self.verify_thread(archive_path, context), daemon=True).start()
+
+  def verify_thread(self, archive_path, context: AppContext):
+    """Verify an archive and show the result"""
+    _ok, text = self.engine.verify(archive_path)
+    context.root.after(0, lambda: self.after_verify(context, text))
+
+  def after_verify(self, context: AppContext, text):
+    """Stop the progress and show the verification result"""
+    context.stop_progress()
+    ttk.Label(context.progress_frame, text=text, font=(context.font_family, 12)).pack()
@@ -0,0 +1,386 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: backup_engine.py
+Description: The scan/archive/estimate/verify engine of backups, without any UI
+'''
+
+import os
+import tarfile
+import datetime
+import logging
+import json
+import re
+import contextlib
+from compression import ParallelBlockWriter, get_codec, codec_for_name
+from calibration import calibrate
+from estimator import estimate
+from member_codec import MemberCompressor
+from scanner import Scanner, TYPE_FILE
+from archiver import Archiver
+from incremental import BackupIndex, DELETED_MEMBER
+from dedup_store import ChunkStore, SnapshotWriter
+from progress import ProgressTracker
+from volumes import VolumeWriter, find_volumes
+from throttle import BackupCancelled, background_worker, ignore_interrupts
+from verify import CHECKSUM_SUFFIX, verify_archive
+from checkpoint import Checkpoint, Checkpointer, remaining_entries, open_resumed, open_sidecar
+from archive_index import IndexWriter, INDEX_SUFFIX
+from exclusions import ExclusionRules, DEFAULT_PRESETS
+from backup_settings import BackupSettings
+from i18n import _
+
+class BackupEngine():
+  """
+  Scans, archives, estimates and verifies with the given settings; it never touches the UI,
+  on_progress(info) and on_status(text) are called on the thread doing the work
+  """
+  def __init__(self, settings: BackupSettings, on_progress=None, on_status=None):
+    self.settings = settings
+    self.scanner = Scanner()
+    self.on_progress = on_progress
+    self.on_status = on_status
+
+  def folder_info(self, path):
+    """A source folder as kept in settings.backup_input"""
+    return {
+      "path": os.path.normpath(path),
+      "size_bytes": 0,
+      "size_human": _("calculating…"),
+      "manifest": None # reused by the archiver, no second traversal
+    }
+
+  def status(self, text):
+    """Report what the engine is doing"""
+    if self.on_status is not None:
+      self.on_status(text)
+
+  def exclusion_rules(self):
+    """Exclusion rules from the backup settings"""
+    return ExclusionRules(
+      presets=DEFAULT_PRESETS if self.settings.exclude_junk else (),
+      patterns=self.settings.exclude_patterns,
+      max_size=self.settings.exclude_larger_than,
+      max_age_days=self.settings.exclude_older_than,
+      skip_placeholders=self.settings.skip_placeholders
+    )
+
+  def scan_folder(self, path, previous=None, matcher=None):
+    """Build the file manifest of a source folder in a single traversal, pruning excluded entries"""
+    return self.scanner.scan(os.path.normpath(path), self.folder_arcname(path), previous, matcher)
+
+  def folder_arcname(self, path):
+    """Name of a source folder inside the archive"""
+    return os.path.basename(os.path.normpath(path).rstrip("\\/"))
+
+  def get_size_hr(self, total):
+    """Calculate folder size in human-readable format"""
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+      if total < 1024:
+        return f"{total:.1f} {unit}"
+      total /= 1024
+    return f"{total:.1f} PB"
+
+  def run(self):
+    """Back up the sources as the settings say, return a short summary for the user"""
+    if self.settings.dedup:
+      return self.create_dedup_snapshot()
+    return self.create_tar_archive()
+
+  def remove_outputs(self, output_path):
+    """Delete an unfinished archive, its volumes and the files written along with it"""
+    for path in [output_path, *find_volumes(output_path), output_path + CHECKSUM_SUFFIX, output_path + INDEX_SUFFIX]:
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
+
+  def create_tar_archive(self):
+    """Create a tar/compressed tar archive, or continue the one an interrupted run left behind"""
+    settings = self.settings
+    index = None
+    suffix = ""
+    if settings.incremental:
+      index = BackupIndex(settings.backup_output).load()
+      rules = self.exclusion_rules().signature()
+      if index.needs_full() or index.exclusions != rules: # files excluded before may be included now
+        index.reset()
+        index.exclusions = rules
+      else:
+        suffix = "_incr"
+
+    checkpoint = Checkpoint(settings.backup_output, self.backup_settings())
+    resume = checkpoint.load()
+    timestamp = self.start_log()
+    codec, level = self.choose_codec(resume)
+    if resume is None:
+      if codec and not settings.per_file_compression:
+        extension = "tar." + get_codec(codec).extension
+      else:
+        extension = "tar"
+      archive_name = f"backup_{timestamp}{suffix}.{extension}"
+    else:
+      archive_name = resume["archive_name"]
+      logging.info("%s %s", _("Resuming interrupted backup"), archive_name)
+    output_path = os.path.join(settings.backup_output, archive_name)
+
+    initializer = background_worker if settings.low_priority else ignore_interrupts # for compression workers
+    on_wait = settings.backup_control and settings.backup_control.check
+    try:
+      with self.open_output(output_path, resume) as raw, \
+          open_sidecar(output_path + CHECKSUM_SUFFIX, resume, 0) as checksums, \
+          open_sidecar(output_path + INDEX_SUFFIX, resume, 1) as index_file, \
+          contextlib.ExitStack() as stack:
+        sidecars = (checksums, index_file)
+        index_writer = IndexWriter(index_file)
+        writer = None
+        compressor = None
+        if codec and settings.per_file_compression:
+          # a plain tar, compressible files are compressed one by one and the rest is stored
+          compressor = stack.enter_context(MemberCompressor(settings.compress_workers, level, codec, initializer,
+            on_wait))
+        elif codec:
+          # blocks are compressed in parallel, tarfile only sees an uncompressed stream
+          start_position = resume["tar_offset"] if resume else 0
+          writer = stack.enter_context(ParallelBlockWriter(raw, workers=settings.compress_workers, level=level,
+            start_position=start_position, on_block=index_writer.block, codec=codec, initializer=initializer,
+            on_wait=on_wait))
+        tar = stack.enter_context(tarfile.open(fileobj=writer or raw, mode="w"))
+        checkpointer = Checkpointer(checkpoint, archive_name, raw, tar, writer, sidecars=sidecars)
+        archiver = Archiver(tar, checksum_file=checksums, index_writer=index_writer, compressor=compressor,
+                            control=settings.backup_control)
+        self.write_sources(archiver, index, archive_name, checkpointer, resume)
+    except BackupCancelled:
+      self.remove_outputs(output_path) # no half-written archive stays in the destination
+      checkpoint.remove()
+      raise
+    if index is not None:
+      index.save() # only after the archive is complete
+    checkpoint.remove()
+    return {"archive": output_path, "failed": sorted(archiver.failed_paths), "text": None}
+
+  def plan(self):
+    """(manifest, entries) of what a backup with the current settings would archive"""
+    matcher = self.exclusion_rules().compile()
+    manifests = [self.current_manifest(folder_info, matcher) for folder_info in self.settings.backup_input]
+    plan = [(manifest, manifest.entries) for manifest in manifests]
+    if self.settings.incremental:
+      index = BackupIndex(self.settings.backup_output).load()
+      if not index.needs_full() and index.exclusions == matcher.signature:
+        plan, _deleted = self.plan_incremental(index, manifests)
+    return plan
+
+  def estimate(self):
+    """Dry run: expected archive size and duration for every codec, see estimator.estimate"""
+    self.status(_("Estimating…"))
+    return estimate(self.plan(), self.settings.backup_output, self.settings.compress_workers,
+                    self.settings.per_file_compression)
+
+  def estimate_text(self, result):
+    """Estimate in human-readable form, one line per codec"""
+    lines = [_("{size} in {count} files, {free} free on the destination").format(
+      size=self.get_size_hr(result["data_size"]), count=result["files"], free=self.get_size_hr(result["free"]))]
+    for item in result["estimates"]:
+      line = "{codec}: ~{size}, {eta}".format(codec=item["codec"] or _("no compression"),
+        size=self.get_size_hr(item["size"]), eta=datetime.timedelta(seconds=int(item["seconds"])))
+      if not item["fits"]:
+        line += ", " + _("does not fit")
+      lines.append(line)
+    return "\n".join(lines)
+
+  def choose_codec(self, resume=None):
+    """(codec name or None, level) for this run, calibrated on the sources in auto mode"""
+    settings = self.settings
+    if not settings.compress:
+      return None, None
+    if resume is not None and not settings.per_file_compression:
+      codec = codec_for_name(resume["archive_name"]) # a resumed stream goes on with its codec
+      return (codec.name if codec else None), settings.codec_level
+    if settings.codec != "auto":
+      return settings.codec, settings.codec_level
+
+    self.status(_("Calibrating compression…"))
+    matcher = self.exclusion_rules().compile()
+    manifests = [self.current_manifest(folder_info, matcher) for folder_info in settings.backup_input]
+    result = calibrate(manifests, settings.backup_output, settings.compress_workers, settings.per_file_compression)
+    for item in result["estimates"]:
+      logging.info("%s %s %s: %s %.2f, %s %s", _("Calibration"), item["codec"] or _("no compression"),
+        item["level"] or "", _("ratio"), item["ratio"], _("estimated time"),
+        datetime.timedelta(seconds=int(item["seconds"])))
+    logging.info("%s %s %s (%s %s/s)", _("Chosen compression:"), result["codec"] or _("none"), result["level"] or "",
+      _("destination writes"), self.get_size_hr(result["write_speed"]))
+    return result["codec"], result["level"]
+
+  def backup_settings(self):
+    """Settings a checkpoint is valid for: the same sources written the same way"""
+    settings = self.settings
+    return {
+      "sources": [folder_info["path"] for folder_info in settings.backup_input],
+      "compress": settings.compress,
+      "per_file_compression": settings.per_file_compression,
+      "codec": settings.codec,
+      "codec_level": settings.codec_level,
+      "volume_size": settings.volume_size,
+      "incremental": settings.incremental,
+      "exclusions": self.exclusion_rules().signature(),
+    }
+
+  def open_output(self, output_path, resume=None):
+    """Archive file, or a stream of output_path.001, .002, ... volumes when a volume size is set"""
+    offset = resume["raw_offset"] if resume else 0
+    if self.settings.volume_size:
+      return VolumeWriter(output_path, self.settings.volume_size, offset)
+    if resume:
+      return open_resumed(output_path, offset)
+    return open(output_path, "wb")
+
+  def new_progress(self, total):
+    """Progress tracker for a run, reporting to on_progress"""
+    return ProgressTracker(total, self.on_progress)
+
+  def start_log(self):
+    """Start the log file of a backup run in the destination, return the run timestamp"""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    log_filename = f"log_{timestamp}.txt"
+    log_path = os.path.join(self.settings.backup_output, log_filename)
+
+    logging.basicConfig(
+      filename=log_path,
+      level=logging.INFO,
+      format='%(asctime)s - %(levelname)s - %(message)s',
+      filemode='w'  # overwrite if re-run
+    )
+    return timestamp
+
+  def create_dedup_snapshot(self):
+    """Store new chunks of all source folders in the deduplicating store and write a snapshot"""
+    timestamp = self.start_log()
+    matcher = self.exclusion_rules().compile()
+    manifests = [self.current_manifest(folder_info, matcher) for folder_info in self.settings.backup_input]
+    progress = self.new_progress(sum(manifest.total_size for manifest in manifests))
+    store = ChunkStore(self.settings.backup_output).open()
+    # files unchanged since the last snapshot keep its chunk lists and are not read again
+    writer = SnapshotWriter(store, progress=progress, control=self.settings.backup_control,
+                            previous=store.latest_snapshot())
+    for manifest in manifests:
+      writer.add_manifest(manifest)
+    writer.save(f"snapshot_{timestamp}")
+
+    stats = writer.stats
+    ratio = writer.dedup_ratio()
+    text = _("Deduplicated snapshot: {logical} of data, {written} written, dedup ratio {ratio}").format(
+      logical=self.get_size_hr(stats["logical_bytes"]),
+      written=self.get_size_hr(stats["written_bytes"]),
+      ratio="∞" if ratio == float("inf") else f"{ratio:.1f}x"
+    )
+    logging.info("%s (%s files, %s unchanged, %s chunks, %s new)", text, stats["files"], stats["reused_files"],
+                 stats["chunks"], stats["new_chunks"])
+    return {"snapshot": f"snapshot_{timestamp}", **stats, "text": text}
+
+  def write_sources(self, archiver, index, archive_name, checkpointer, resume=None):
+    """Add all source folders, or only the changes since the last run when there is an index"""
+    matcher = self.exclusion_rules().compile()
+    manifests = [self.current_manifest(folder_info, matcher, index) for folder_info in self.settings.backup_input]
+    for manifest in manifests:
+      if manifest.excluded:
+        logging.info("%s %s: %s (%s)", _("Excluded"), manifest.root, manifest.excluded, self.get_size_hr(manifest.excluded_size))
+    if index is None:
+      plan = [(manifest, manifest.entries) for manifest in manifests]
+      deleted = []
+    else:
+      plan, deleted = self.plan_incremental(index, manifests)
+    plan = [(manifest, remaining_entries(resume, folder_no, entries)) for folder_no, (manifest, entries) in enumerate(plan)]
+
+    total = sum(entry.size for _, entries in plan for entry in entries if entry.type == TYPE_FILE)
+    archiver.progress = self.new_progress(total)
+    if resume is not None:
+      archiver.failed_paths.update(resume["failed_paths"])
+    elif deleted:
+      archiver.add_bytes(DELETED_MEMBER, json.dumps(deleted).encode("utf-8"))
+    for folder_no, (manifest, entries) in enumerate(plan):
+      archiver.add_entries(manifest, entries,
+        lambda entry, no=folder_no: checkpointer.after_entry(no, entry.rel, archiver.failed_paths))
+    if index is not None:
+      index.record(archive_name, manifests, deleted, archiver.failed_paths)
+
+  def current_manifest(self, folder_info, matcher, index=None):
+    """
+    Fresh manifest of a source folder: folders unchanged since the sizing scan, or else the last backup,
+    are not listed again, but every file is stat'ed again to catch in-place edits
+    """
+    manifest = folder_info.get("manifest")
+    if manifest is not None and manifest.rules == matcher.signature:
+      previous = manifest.tree()
+    else:
+      previous = index.previous_tree(os.path.normpath(folder_info["path"])) if index else None
+    manifest = self.scan_folder(folder_info["path"], previous, matcher)
+    folder_info["manifest"] = manifest
+    return manifest
+
+  def plan_incremental(self, index, manifests):
+    """New and changed entries of every manifest and arcnames deleted since the last run"""
+    deleted = index.deleted_folders({manifest.root for manifest in manifests})
+    plan = []
+    for manifest in manifests:
+      changed, removed = index.diff(manifest)
+      plan.append((manifest, changed))
+      deleted.extend(removed)
+    return plan, deleted
+
+  def verify(self, archive_path):
+    """Check an archive against its checksum manifest, return (ok, text for the user)"""
+    base_path = re.sub(r"\.\d{3}$", "", os.path.normpath(archive_path))
+    try:
+      result = verify_archive(base_path, workers=self.settings.compress_workers)
+    except (OSError, EOFError, tarfile.TarError) as e:
+      return False, _("Verification failed: ") + str(e)
+    if result["ok"]:
+      return True, _("Archive verified: {count} files match their checksums").format(count=result["verified"])
+    for name in result["mismatched"] + result["missing"]:
+      logging.error("%s %s", _("Verification failed for"), name)
+    return False, _("Archive damaged: {bad} files differ, {missing} files missing").format(
+      bad=len(result["mismatched"]), missing=len(result["missing"]))
+
+  def path_error(self, error_code):
+    """Text of a validate_backup_paths error"""
+    error_arr = [
+      _("OK"),
+      _("No source folders selected"),
+      _("No destination folder selected"),
+      _("Destination is one of the input folders"),
+      _("One input folder is a subfolder of another input folder"),
+      _("Output is inside one of the input folders (cyclic backup)"),
+    ]
+    return "Error: " + error_arr[error_code]
+
+  def validate_backup_paths(self):
+    """Check for source/destination errors"""
+    input_paths = [(folder["path"]) for folder in self.settings.backup_input]
+    output_path = self.settings.backup_output if self.settings.backup_output else None
+    # 1. No source folders selected
+    if not input_paths:
+      return 1
+
+    # 2. No destination folder selected
+    if not output_path:
+      return 2
+
+    # 3. Output is one of the input folders
+    if output_path in input_paths:
+      return 3
+
+    # 4. One input folder is a subfolder of another input folder
+    for i, path1 in enumerate(input_paths):
+      for j, path2 in enumerate(input_paths):
+        if i != j and path1.startswith(path2 + os.sep):
+          return 4
+
+    # 5. Output is inside one of the input folders (cyclic backup)
+    for source in input_paths:
+      if output_path.startswith(source + os.sep):
+        return 5
+
+    return 0
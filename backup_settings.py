@@ -0,0 +1,33 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: backup_settings.py
+Description: Backup options and their defaults, kept apart from the engine so the UI starts without loading it
+'''
+
+import os
+
+class BackupSettings():
+  """Backup options and their defaults, the UI context and the command line both carry them"""
+  def __init__(self):
+    self.backup_input = [] # folders to backup, see BackupEngine.folder_info
+    self.backup_output = None # where to put a backup
+    self.compress = False
+    self.compress_workers = os.cpu_count() or 1 # processes for parallel compression
+    self.codec = "auto" # bz2, xz, zstd, lz4, or auto: calibrated against the destination on every run
+    self.codec_level = 0 # 0 - default level of the codec
+    self.per_file_compression = False # compress file by file in a plain tar, store photos, videos, archives as-is
+    self.incremental = False # archive only changes since the last backup in the destination
+    self.dedup = False # deduplicating chunk store instead of a tar archive
+    self.volume_size = 0 # split the archive into volumes of this many bytes, 0 - single file
+    self.exclude_junk = False # skip the built-in junk presets (caches, temp files, node_modules, ...)
+    self.skip_placeholders = False # skip online-only OneDrive and other cloud files, reading them downloads them
+    self.exclude_patterns = [] # user glob patterns
+    self.exclude_larger_than = 0 # bytes, 0 - no limit
+    self.exclude_older_than = 0 # days, 0 - no limit
+    self.bandwidth_limit = 0 # bytes per second read from the sources, 0 - no limit
+    self.low_priority = False # background CPU and I/O priority for the backup
+    self.backup_control = None # pause/resume/cancel of the running backup
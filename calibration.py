@@ -0,0 +1,122 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: calibration.py
+Description: Picks the codec and level with the shortest backup time from a short run on a sample of the sources
+'''
+
+import io
+import os
+import time
+import random
+from compression import CODECS
+from member_codec import should_compress
+from scanner import TYPE_FILE
+
+CANDIDATES = [("lz4", 1), ("zstd", 3), ("zstd", 9), ("bz2", 9), ("xz", 6)] # (codec, level), fastest first
+SAMPLE_FILES = 64
+SAMPLE_CHUNK = 256 * 1024 # bytes read from each sampled file
+CODEC_TIME_BUDGET = 0.3 # seconds of compression per candidate
+WRITE_TEST_SIZE = 16 * 1024 * 1024
+WRITE_TEST_FILENAME = "lmtk_write_test.tmp"
+CLOSE_ENOUGH = 1.05 # among estimates this close to the best one the smallest output wins
+
+def sample_files(candidates, files, rng, chunk=SAMPLE_CHUNK):
+  """
+  (name, size, data) of chunks read at random offsets of files picked from candidates, a non-empty list
+  of (manifest, entry), in proportion to their size
+  """
+  picked = set(rng.choices(range(len(candidates)), weights=[entry.size for _, entry in candidates], k=files))
+  samples = []
+  for i in sorted(picked):
+    manifest, entry = candidates[i]
+    try:
+      with open(manifest.path(entry.rel), "rb") as f:
+        f.seek(rng.randrange(max(1, entry.size - chunk)))
+        samples.append((entry.rel, entry.size, f.read(chunk)))
+    except OSError:
+      continue
+  return samples
+
+def sample_sources(manifests, files=SAMPLE_FILES, chunk=SAMPLE_CHUNK):
+  """Sample chunks of the files of all manifests, see sample_files"""
+  candidates = [(manifest, entry) for manifest in manifests for entry in manifest.entries
+                if entry.type == TYPE_FILE and entry.size > 0]
+  if not candidates:
+    return []
+  return sample_files(candidates, files, random.Random(0), chunk) # the same sources give the same sample
+
+def measure_write_speed(destination, size=WRITE_TEST_SIZE):
+  """Bytes per second the destination takes, synced to the device"""
+  path = os.path.join(destination, WRITE_TEST_FILENAME)
+  block = os.urandom(1024 * 1024)
+  started = time.monotonic()
+  try:
+    with open(path, "wb") as f:
+      for _ in range(size // len(block)):
+        f.write(block)
+      f.flush()
+      os.fsync(f.fileno())
+    return size / max(time.monotonic() - started, 1e-6)
+  finally:
+    os.remove(path)
+
+def measure_pieces(codec, level, groups, budget=CODEC_TIME_BUDGET):
+  """
+  (bytes per second on one core, [(bytes, compressed bytes)] of every group compressed) for groups of sample
+  pieces taken in order until the time budget is used up, a started group is always finished
+  """
+  measured = []
+  done = 0
+  started = time.monotonic()
+  for pieces in groups:
+    original = compressed = 0
+    for piece in pieces:
+      compressed += len(codec.compress(piece, level))
+      original += len(piece)
+    measured.append((original, compressed))
+    done += original
+    if time.monotonic() - started > budget:
+      break
+  elapsed = max(time.monotonic() - started, 1e-6)
+  return done / elapsed, measured
+
+def measure_codec(codec, level, data, budget=CODEC_TIME_BUDGET):
+  """(bytes per second on one core, compressed/original ratio) for the sample, within a time budget"""
+  speed, measured = measure_pieces(codec, level, [[piece] for piece in data], budget)
+  done = sum(original for original, _ in measured)
+  return speed, sum(compressed for _, compressed in measured) / max(done, 1)
+
+def calibrate(manifests, destination, workers=1, per_file=False):
+  """
+  Estimate the backup time of every available candidate and of storing without compression;
+  compressing and writing overlap, so a run takes as long as the slower of the two
+  with per-file compression only the files that would be compressed go through the codec
+  """
+  samples = sample_sources(manifests)
+  total = sum(manifest.total_size for manifest in manifests)
+  if per_file:
+    data = [sample for name, size, sample in samples if should_compress(name, size, io.BytesIO(sample))]
+  else:
+    data = [sample for _, _, sample in samples]
+  sampled = sum(len(sample) for _, _, sample in samples)
+  share = sum(len(sample) for sample in data) / sampled if sampled else 0 # bytes going through the codec
+  write_speed = measure_write_speed(destination)
+
+  estimates = [{"codec": None, "level": None, "ratio": 1.0, "seconds": total / write_speed}]
+  if data:
+    for name, level in CANDIDATES:
+      codec = CODECS[name]
+      if not codec.available:
+        continue
+      speed, ratio = measure_codec(codec, level, data)
+      compress_time = total * share / (speed * max(1, workers))
+      write_time = (total * share * ratio + total * (1 - share)) / write_speed
+      estimates.append({"codec": name, "level": level, "ratio": ratio, "seconds": max(compress_time, write_time)})
+
+  best = min(estimate["seconds"] for estimate in estimates)
+  choice = min((e for e in estimates if e["seconds"] <= best * CLOSE_ENOUGH), key=lambda e: e["ratio"])
+  return {**choice, "write_speed": write_speed, "share": share, "estimates": estimates}
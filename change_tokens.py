@@ -0,0 +1,87 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: change_tokens.py
+Description: Cheap fingerprints of what the report collectors read, a changed token means a section is collected again
+'''
+
+import os
+import json
+import ctypes
+import hashlib
+
+UNINSTALL_KEYS = [
+  r"Software\Microsoft\Windows\CurrentVersion\Uninstall",
+  r"Software\Wow6432Node\Microsoft\Windows\CurrentVersion\Uninstall",
+]
+# one subkey per installed package version, Get-AppxPackage reads the same repository
+APPX_PACKAGES_KEY = r"Software\Classes\Local Settings\Software\Microsoft\Windows\CurrentVersion\AppModel\Repository\Packages"
+CPU_KEY = r"HARDWARE\DESCRIPTION\System\CentralProcessor"
+DEVICE_ENUM_KEYS = [r"SYSTEM\CurrentControlSet\Enum\PCI", r"SYSTEM\CurrentControlSet\Enum\USB",
+  r"SYSTEM\CurrentControlSet\Enum\SWD\PRINTENUM"] # GPUs, network adapters, scanners, printers
+
+def digest(state):
+  """Token of a JSON-serializable state"""
+  return hashlib.sha1(json.dumps(state, default=str).encode("utf-8")).hexdigest()
+
+def subkeys(hive, path, modified=False):
+  """Subkey names of a registry key, with their last write times if asked for; [] if there is no such key"""
+  import winreg # pylint: disable=import-outside-toplevel
+  try:
+    with winreg.OpenKey(hive, path) as key:
+      names = [winreg.EnumKey(key, i) for i in range(winreg.QueryInfoKey(key)[0])]
+      if not modified:
+        return names
+      state = []
+      for name in names:
+        with winreg.OpenKey(key, name) as subkey:
+          state.append([name, winreg.QueryInfoKey(subkey)[2]]) # 100 ns units since 1601
+      return state
+  except FileNotFoundError:
+    return []
+
+def standard_apps_token():
+  """Installing, updating or removing an app writes to its Uninstall subkey"""
+  import winreg # pylint: disable=import-outside-toplevel
+  return digest([subkeys(winreg.HKEY_LOCAL_MACHINE, path, modified=True) for path in UNINSTALL_KEYS])
+
+def store_apps_token():
+  """Package full names include the version, an update replaces the subkey"""
+  import winreg # pylint: disable=import-outside-toplevel
+  return digest(subkeys(winreg.HKEY_CURRENT_USER, APPX_PACKAGES_KEY))
+
+def devices_token():
+  """
+  Processor, memory size, fixed drive letters and the devices Windows has seen; drive free space isn't
+  part of it, the report refreshes it from the cached drives
+  """
+  import winreg # pylint: disable=import-outside-toplevel
+  with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, CPU_KEY + r"\0") as key:
+    cpu = winreg.QueryValueEx(key, "ProcessorNameString")[0]
+  memory = ctypes.c_ulonglong()
+  ctypes.windll.kernel32.GetPhysicallyInstalledSystemMemory(ctypes.byref(memory))
+  return digest([
+    cpu,
+    len(subkeys(winreg.HKEY_LOCAL_MACHINE, CPU_KEY)),
+    memory.value,
+    ctypes.windll.kernel32.GetLogicalDrives(),
+    [sorted(subkeys(winreg.HKEY_LOCAL_MACHINE, path)) for path in DEVICE_ENUM_KEYS],
+  ])
+
+SECTION_TOKENS = {
+  "standard_apps": standard_apps_token,
+  "store_apps": store_apps_token,
+  "devices": devices_token,
+}
+
+def section_token(section):
+  """Token of an inventory section, None where it can't be computed and the section is always collected"""
+  if os.name != "nt":
+    return None
+  try:
+    return SECTION_TOKENS[section]()
+  except OSError:
+    return None
@@ -0,0 +1,116 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: checkpoint.py
+Description: Periodic checkpoints of a running archive and resuming it after an interruption
+'''
+
+import os
+import json
+import time
+from volumes import volume_path
+
+CHECKPOINT_FILENAME = "lmtk_checkpoint.json"
+CHECKPOINT_INTERVAL = 30 # seconds between checkpoints, each one costs an fsync
+
+class Checkpoint():
+  """Checkpoint file in the destination, only valid for a run with the same sources and settings"""
+  def __init__(self, destination, settings):
+    self.destination = destination
+    self.path = os.path.join(destination, CHECKPOINT_FILENAME)
+    self.settings = settings
+
+  def load(self):
+    """State of the interrupted run or None if there is none for these settings"""
+    try:
+      with open(self.path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    except (OSError, ValueError):
+      return None
+    if state.get("settings") != self.settings:
+      return None
+    archive_path = os.path.join(self.destination, state["archive_name"])
+    if not os.path.exists(archive_path) and not os.path.exists(volume_path(archive_path, 1)):
+      return None
+    return state
+
+  def save(self, state):
+    """Write the checkpoint atomically"""
+    state["settings"] = self.settings
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+      json.dump(state, f)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_path, self.path)
+
+  def remove(self):
+    """Forget the checkpoint after the archive is complete"""
+    try:
+      os.remove(self.path)
+    except FileNotFoundError:
+      pass
+
+class Checkpointer():
+  """Called after every archived entry, every interval seconds makes the archive durable and saves a checkpoint"""
+  def __init__(self, checkpoint, archive_name, raw, tar, writer=None, interval=CHECKPOINT_INTERVAL, sidecars=()):
+    self.checkpoint = checkpoint
+    self.archive_name = archive_name
+    self.raw = raw # file or VolumeWriter the archive bytes go to
+    self.tar = tar
+    self.writer = writer # ParallelBlockWriter between tar and raw, if compressed
+    self.interval = interval
+    self.sidecars = sidecars # files written along with the archive, e.g. checksums
+    self._last = time.monotonic()
+
+  def after_entry(self, folder_no, rel, failed_paths):
+    """Save a checkpoint if the interval has passed"""
+    now = time.monotonic()
+    if now - self._last < self.interval:
+      return
+    self._last = now
+    if self.writer is not None:
+      self.writer.sync() # the member ends a compressed block, so the output can be cut here
+    for f in (self.raw, *self.sidecars):
+      f.flush()
+      os.fsync(f.fileno())
+    self.checkpoint.save({
+      "archive_name": self.archive_name,
+      "raw_offset": self.raw.tell(),
+      "tar_offset": self.tar.offset,
+      "folder_no": folder_no,
+      "rel": rel,
+      "failed_paths": sorted(failed_paths),
+      "sidecar_offsets": [f.tell() for f in self.sidecars],
+    })
+
+def remaining_entries(state, folder_no, entries):
+  """Entries of a source folder still to archive after resuming from state"""
+  if state is None or folder_no > state["folder_no"]:
+    return entries
+  if folder_no < state["folder_no"]:
+    return []
+  for i, entry in enumerate(entries):
+    if entry.rel == state["rel"]:
+      return entries[i + 1:]
+  return entries # the last archived entry is gone, archive the folder again: later members win on extract
+
+def open_resumed(path, offset):
+  """Open an archive file for writing, truncated after the last checkpointed byte"""
+  f = open(path, "r+b") # pylint: disable=consider-using-with
+  f.truncate(offset)
+  f.seek(offset)
+  return f
+
+def open_sidecar(path, state, number):
+  """Open a text file written along with the archive: new, or cut at its checkpointed size on resume"""
+  if state is None:
+    return open(path, "w", encoding="utf-8") # pylint: disable=consider-using-with
+  f = open(path, "r+", encoding="utf-8") # pylint: disable=consider-using-with
+  offset = state["sidecar_offsets"][number]
+  f.truncate(offset)
+  f.seek(offset)
+  return f
@@ -0,0 +1,317 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: compression.py
+Description: Codecs and block-parallel compression of the tar stream on a process pool
+'''
+
+import bz2 # block codec, concatenated streams are valid bz2
+import lzma
+import os
+import re
+import tarfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+try:
+  import zstandard # optional, the codec is offered only if it is installed
+except ImportError:
+  zstandard = None
+try:
+  import lz4.frame # optional, the codec is offered only if it is installed
+except ImportError:
+  lz4 = None
+
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024 # uncompressed bytes per independent stream
+BZ2_MAGIC = b"BZh"
+BZ2_STREAM_START = re.compile(rb"BZh[1-9]1AY&SY") # stream header followed by the first block magic
+READ_SEGMENT_SIZE = 4 * 1024 * 1024 # compressed bytes read at once by the parallel reader
+WAIT_SLICE = 0.1 # seconds between on_wait calls while waiting for a block
+
+class Codec():
+  """A compression format whose streams can be concatenated: every block is compressed on its own"""
+  def __init__(self, name, extension, magic, levels, default_level, module):
+    self.name = name
+    self.extension = extension # file suffix without the dot
+    self.magic = magic # first bytes of every stream
+    self.levels = levels # (lowest, highest)
+    self.default_level = default_level
+    self.available = module is not None
+
+  def level(self, level=None):
+    """Level to use: the default for None or 0, otherwise clamped to the supported range"""
+    if not level:
+      return self.default_level
+    return max(self.levels[0], min(self.levels[1], level))
+
+  def compress(self, data, level=None):
+    """Compress data into one complete stream"""
+    level = self.level(level)
+    if self.name == "bz2":
+      return bz2.compress(data, level)
+    if self.name == "xz":
+      return lzma.compress(data, preset=level)
+    if self.name == "zstd":
+      return zstandard.ZstdCompressor(level=level).compress(data)
+    return lz4.frame.compress(data, compression_level=level)
+
+  def decompressor(self):
+    """Incremental decompressor of one stream with eof and unused_data"""
+    if self.name == "bz2":
+      return bz2.BZ2Decompressor()
+    if self.name == "xz":
+      return lzma.LZMADecompressor()
+    if self.name == "zstd":
+      return zstandard.ZstdDecompressor().decompressobj()
+    return lz4.frame.LZ4FrameDecompressor()
+
+  def reader(self, fileobj):
+    """Readable file object with the uncompressed data of all concatenated streams"""
+    if self.name == "bz2":
+      return bz2.BZ2File(fileobj)
+    if self.name == "xz":
+      return lzma.LZMAFile(fileobj)
+    if self.name == "zstd":
+      return zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True)
+    return lz4.frame.LZ4FrameFile(fileobj)
+
+CODECS = {
+  "bz2": Codec("bz2", "bz2", BZ2_MAGIC, (1, 9), 9, bz2),
+  "xz": Codec("xz", "xz", b"\xfd7zXZ\x00", (1, 9), 6, lzma),
+  "zstd": Codec("zstd", "zst", b"\x28\xb5\x2f\xfd", (1, 19), 3, zstandard),
+  "lz4": Codec("lz4", "lz4", b"\x04\x22\x4d\x18", (1, 12), 1, lz4),
+}
+MAGIC_SIZE = max(len(codec.magic) for codec in CODECS.values()) # bytes to read to tell the codecs apart
+
+def get_codec(name):
+  """Codec by name, tarfile.CompressionError if its module is not installed"""
+  codec = CODECS.get(name)
+  if codec is None or not codec.available:
+    raise tarfile.CompressionError(f"{name} compression is not available")
+  return codec
+
+def available_codecs():
+  """Names of the codecs that can be used here"""
+  return [name for name, codec in CODECS.items() if codec.available]
+
+def codec_for_magic(magic):
+  """Codec of data starting with magic, None for uncompressed data"""
+  for codec in CODECS.values():
+    if magic.startswith(codec.magic):
+      return codec
+  return None
+
+def codec_for_name(filename):
+  """Codec of an archive from its file name, None for a plain tar"""
+  for codec in CODECS.values():
+    if filename.endswith(".tar." + codec.extension):
+      return codec
+  return None
+
+def compress_block(data, codec_name, level):
+  """Compress one block into a complete stream (runs in a worker process)"""
+  return CODECS[codec_name].compress(data, level)
+
+def decompress_segment(data):
+  """Decompress one or more complete bz2 streams (runs in a worker process)"""
+  return bz2.decompress(data)
+
+def decompressed_reader(fileobj, magic):
+  """
+  Readable file object with the uncompressed data of a stream starting with magic;
+  unlike tarfile's "r|bz2" it reads all concatenated streams, not only the first block
+  """
+  codec = codec_for_magic(magic)
+  if codec is None:
+    return fileobj
+  return get_codec(codec.name).reader(fileobj)
+
+class ParallelBlockWriter():
+  """
+  Write-only file object for tarfile: the stream is cut into fixed-size blocks,
+  blocks are compressed on a process pool and written in order as concatenated streams of the codec
+  """
+  def __init__(self, fileobj, workers=None, block_size=DEFAULT_BLOCK_SIZE, level=None, start_position=0, on_block=None,
+               executor=None, codec="bz2", initializer=None, on_wait=None):
+    self.fileobj = fileobj
+    self.codec = get_codec(codec)
+    self.on_wait = on_wait # called repeatedly while waiting for a block, may raise to stop the writer
+    self.on_block = on_block # on_block(uncompressed_start, compressed_start) before a block is written
+    self.workers = max(1, workers or os.cpu_count() or 1)
+    self.block_size = block_size
+    self.level = self.codec.level(level)
+    self.closed = False
+    self._buffer = bytearray()
+    self._pending = deque() # futures in submission order
+    self._max_pending = self.workers * 2 # bounds memory to ~(2 * workers + 1) blocks
+    self._position = start_position # uncompressed bytes accepted, a resumed archive starts mid-stream
+    self._submitted = start_position # uncompressed start of the next block
+    self._blocks_written = 0
+    self._own_executor = executor is None # a shared pool is left running on close
+    if executor is not None:
+      self._executor = executor
+    elif self.workers > 1:
+      self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initializer)
+    else:
+      self._executor = None
+
+  def write(self, data):
+    """Buffer data and hand every full block to the pool"""
+    if self.closed:
+      raise ValueError("I/O operation on closed file")
+    self._buffer += data
+    self._position += len(data)
+    while len(self._buffer) >= self.block_size:
+      block = bytes(self._buffer[:self.block_size])
+      del self._buffer[:self.block_size]
+      self._submit(block)
+    return len(data)
+
+  def tell(self):
+    """Position in the uncompressed stream"""
+    return self._position
+
+  def _submit(self, block):
+    """Queue a block for compression, writing finished blocks to keep the queue bounded"""
+    start = self._submitted
+    self._submitted += len(block)
+    if self._executor is None:
+      self._write_block(start, compress_block(block, self.codec.name, self.level))
+      return
+    self._pending.append((start, self._executor.submit(compress_block, block, self.codec.name, self.level)))
+    while len(self._pending) > self._max_pending:
+      self._write_next()
+
+  def _write_next(self):
+    """Wait for the oldest block and write it"""
+    start, future = self._pending.popleft()
+    if self.on_wait is not None:
+      while wait([future], timeout=WAIT_SLICE).not_done:
+        self.on_wait()
+    self._write_block(start, future.result())
+
+  def _write_block(self, start, compressed):
+    """Write one compressed stream to the destination"""
+    if self.on_block is not None:
+      self.on_block(start, self.fileobj.tell())
+    self.fileobj.write(compressed)
+    self._blocks_written += 1
+
+  def sync(self):
+    """Compress the buffered bytes as a block of their own and wait until every block is written"""
+    if self._buffer:
+      self._submit(bytes(self._buffer))
+      self._buffer.clear()
+    while self._pending:
+      self._write_next()
+
+  def close(self):
+    """Compress the tail, wait for all blocks and stop the pool; the destination stays open"""
+    if self.closed:
+      return
+    try:
+      # an empty archive still has to be a valid compressed file
+      if self._buffer or (self._blocks_written == 0 and not self._pending):
+        self._submit(bytes(self._buffer))
+        self._buffer.clear()
+      while self._pending:
+        self._write_next()
+    finally:
+      self.closed = True
+      if self._executor is not None and self._own_executor:
+        self._executor.shutdown()
+
+  def abort(self):
+    """Drop queued blocks and stop the pool without writing anything else"""
+    self.closed = True
+    for _, future in self._pending:
+      future.cancel()
+    self._pending.clear()
+    self._buffer.clear()
+    if self._executor is not None and self._own_executor:
+      self._executor.shutdown(wait=False, cancel_futures=True) # blocks being compressed are dropped
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    if exc_type is None:
+      self.close()
+    else:
+      self.abort()
+
+class ParallelBz2Reader():
+  """
+  Read-only file object for concatenated bz2 streams: the compressed data is cut at stream headers
+  in a single pass, segments are decompressed on a process pool and returned in order
+  """
+  def __init__(self, fileobj, workers=None):
+    self.fileobj = fileobj
+    self.workers = max(1, workers or os.cpu_count() or 1)
+    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+    self._pending = deque()
+    self._max_pending = self.workers * 2
+    self._carry = b"" # compressed bytes of the stream(s) not complete yet
+    self._eof = False
+    self._block = b""
+    self._block_pos = 0
+
+  def _next_segment(self):
+    """Compressed bytes up to the last stream header seen, None at the end of the file"""
+    while not self._eof:
+      data = self.fileobj.read(READ_SEGMENT_SIZE)
+      if not data:
+        self._eof = True
+        break
+      self._carry += data
+      cut = None
+      for match in BZ2_STREAM_START.finditer(self._carry, 1):
+        cut = match.start()
+      if cut is not None:
+        segment, self._carry = self._carry[:cut], self._carry[cut:]
+        return segment
+    if self._carry:
+      segment, self._carry = self._carry, b""
+      return segment
+    return None
+
+  def _fill(self):
+    """Keep the pool busy and move the next decompressed segment into the read block"""
+    while len(self._pending) < self._max_pending:
+      segment = self._next_segment()
+      if segment is None:
+        break
+      self._pending.append(self._executor.submit(decompress_segment, segment))
+    if not self._pending:
+      return False
+    self._block = self._pending.popleft().result()
+    self._block_pos = 0
+    return True
+
+  def read(self, size=-1):
+    """Read up to size uncompressed bytes, everything if size is negative"""
+    parts = []
+    while size != 0:
+      if self._block_pos >= len(self._block) and not self._fill():
+        break
+      end = len(self._block) if size < 0 else min(len(self._block), self._block_pos + size)
+      parts.append(self._block[self._block_pos:end])
+      if size > 0:
+        size -= end - self._block_pos
+      self._block_pos = end
+    return b"".join(parts)
+
+  def close(self):
+    """Stop the pool"""
+    for future in self._pending:
+      future.cancel()
+    self._pending.clear()
+    self._executor.shutdown(cancel_futures=True)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.close()
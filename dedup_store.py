@@ -0,0 +1,249 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: dedup_store.py
+Description: Deduplicating backup store: content-defined chunks, content-addressed chunk files, snapshot manifests
+'''
+
+import os
+import json
+import zlib
+import hashlib
+import logging
+from scanner import FileEntry, TYPE_DIR, TYPE_FILE, TYPE_LINK
+from progress import CountingReader
+from throttle import ControlledReader
+from i18n import _
+
+STORE_DIRNAME = "lmtk_store"
+MIN_CHUNK = 256 * 1024
+CUT_BITS = 8 # one in 256 candidates is a cut point: ~1 MiB past the minimum
+MAX_CHUNK = 4 * 1024 * 1024
+READ_SIZE = 1024 * 1024
+WINDOW = 48 # bytes before a candidate that decide whether it is a cut point
+# candidates end where the low nibbles of three bytes are 1, 2, 3 (one in 4096 positions of random data);
+# translate and find run in C, a rolling hash in a per-byte Python loop manages only a few MB/s
+NIBBLES = bytes(b & 0x0F for b in range(256))
+NEEDLE = bytes([1, 2, 3])
+
+class Chunker():
+  """Splits a stream at content-defined cut points: candidates whose preceding window hashes to zero"""
+  def __init__(self, min_size=MIN_CHUNK, cut_bits=CUT_BITS, max_size=MAX_CHUNK):
+    self.min_size = min_size
+    self.max_size = max_size
+    self.mask = (1 << cut_bits) - 1
+
+  def cut_point(self, buf, size):
+    """Length of the next chunk in the first size bytes of buf"""
+    if size <= self.min_size:
+      return size
+    # the first min_size bytes are never a cut point, so they are not searched at all
+    nibbles = buf[self.min_size:size].translate(NIBBLES)
+    found = nibbles.find(NEEDLE)
+    while found >= 0:
+      pos = self.min_size + found + len(NEEDLE)
+      if not zlib.crc32(buf[pos - WINDOW:pos]) & self.mask:
+        return pos
+      found = nibbles.find(NEEDLE, found + 1)
+    return size
+
+  def chunks(self, fileobj):
+    """Yield the chunks of a file object, an inserted byte only changes the chunks around it"""
+    buf = bytearray()
+    eof = False
+    while True:
+      while not eof and len(buf) < self.max_size:
+        data = fileobj.read(READ_SIZE)
+        if data:
+          buf += data
+        else:
+          eof = True
+      if not buf:
+        return
+      cut = self.cut_point(buf, min(len(buf), self.max_size))
+      yield bytes(buf[:cut])
+      del buf[:cut]
+
+class ChunkStore():
+  """Chunks stored once under their SHA-256 and snapshot manifests, in a folder of the destination"""
+  def __init__(self, destination):
+    self.root = os.path.join(destination, STORE_DIRNAME)
+    self.chunks_dir = os.path.join(self.root, "chunks")
+    self.snapshots_dir = os.path.join(self.root, "snapshots")
+    self.known = set()
+
+  def open(self):
+    """Create the store folders and list the chunks once, so lookups need no file system call"""
+    os.makedirs(self.chunks_dir, exist_ok=True)
+    os.makedirs(self.snapshots_dir, exist_ok=True)
+    with os.scandir(self.chunks_dir) as prefixes:
+      for prefix in prefixes:
+        if prefix.is_dir():
+          with os.scandir(prefix.path) as chunks:
+            self.known.update(c.name for c in chunks if not c.name.endswith(".tmp"))
+    return self
+
+  def chunk_path(self, chunk_id):
+    """Chunk files are spread over 256 folders by the first two hex digits"""
+    return os.path.join(self.chunks_dir, chunk_id[:2], chunk_id)
+
+  def put(self, data):
+    """Store a chunk unless it is already there, return its id and the bytes written"""
+    chunk_id = hashlib.sha256(data).hexdigest()
+    if chunk_id in self.known:
+      return chunk_id, 0
+    path = self.chunk_path(chunk_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+      f.write(data)
+    os.replace(tmp_path, path)
+    self.known.add(chunk_id)
+    return chunk_id, len(data)
+
+  def get(self, chunk_id):
+    """Read a chunk"""
+    with open(self.chunk_path(chunk_id), "rb") as f:
+      return f.read()
+
+  def save_snapshot(self, name, snapshot):
+    """Write a snapshot manifest atomically"""
+    path = os.path.join(self.snapshots_dir, name + ".json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+      json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+  def load_snapshot(self, name):
+    """Read a snapshot manifest"""
+    with open(os.path.join(self.snapshots_dir, name + ".json"), "r", encoding="utf-8") as f:
+      return json.load(f)
+
+  def list_snapshots(self):
+    """Snapshot names, oldest first"""
+    return sorted(f[:-5] for f in os.listdir(self.snapshots_dir) if f.endswith(".json"))
+
+  def latest_snapshot(self):
+    """The newest snapshot manifest, None if there is none or it cannot be read"""
+    names = self.list_snapshots()
+    if not names:
+      return None
+    try:
+      return self.load_snapshot(names[-1])
+    except (OSError, ValueError) as e:
+      logging.warning("%s %s: %s", _("Ignoring snapshot"), names[-1], e)
+      return None
+
+class SnapshotWriter():
+  """Adds manifests to a store and collects the per-run dedup statistics"""
+  def __init__(self, store, chunker=None, progress=None, control=None, previous=None):
+    self.store = store
+    self.chunker = chunker or Chunker()
+    self.progress = progress # ProgressTracker fed by file reads
+    self.control = control # BackupControl: pause, cancel and bandwidth limit between reads
+    self.folders = []
+    self.failed_paths = set()
+    self.stats = {"files": 0, "reused_files": 0, "chunks": 0, "new_chunks": 0, "logical_bytes": 0, "written_bytes": 0}
+    self.previous = {} # (root, rel) -> size, mtime and chunk ids in the previous snapshot
+    for folder in (previous or {}).get("folders", []):
+      for record in folder["entries"]:
+        if record[1] == TYPE_FILE:
+          self.previous[(folder["root"], record[0])] = (record[2], record[3], record[5])
+
+  def add_manifest(self, manifest):
+    """Chunk every file of a manifest and record its entries"""
+    for path, e in manifest.errors:
+      logging.error("%s %s: %s", _("Skipping"), path, e)
+    entries = []
+    for entry in manifest.entries:
+      if self.control is not None:
+        self.control.check()
+      path = manifest.path(entry.rel)
+      record = [entry.rel, entry.type, entry.size, entry.mtime, entry.mode]
+      try:
+        if entry.type == TYPE_FILE:
+          record[2], record[3], chunk_ids = self.add_file(path, self.previous.get((manifest.root, entry.rel)))
+          record.append(chunk_ids)
+        elif entry.type == TYPE_LINK:
+          record.append(os.readlink(path))
+      except (PermissionError, FileNotFoundError) as e:
+        self.failed_paths.add(path)
+        logging.error("%s %s: %s", _("Skipping"), path, e)
+        continue
+      entries.append(record)
+    self.folders.append({"root": manifest.root, "arcname": manifest.arcname, "entries": entries})
+
+  def add_file(self, path, previous=None):
+    """Store the chunks of a file, return its size, mtime and chunk ids"""
+    if previous is not None:
+      reused = self.reuse_file(path, *previous)
+      if reused is not None:
+        return reused
+    chunk_ids = []
+    with open(path, "rb") as f:
+      st = os.fstat(f.fileno())
+      reader = f
+      if self.progress is not None:
+        self.progress.set_file(path)
+        reader = CountingReader(f, self.progress)
+      if self.control is not None:
+        reader = ControlledReader(reader, self.control)
+      for chunk in self.chunker.chunks(reader):
+        chunk_id, written = self.store.put(chunk)
+        chunk_ids.append(chunk_id)
+        self.stats["chunks"] += 1
+        self.stats["logical_bytes"] += len(chunk)
+        if written:
+          self.stats["new_chunks"] += 1
+          self.stats["written_bytes"] += written
+    self.stats["files"] += 1
+    return st.st_size, st.st_mtime, chunk_ids
+
+  def reuse_file(self, path, size, mtime, chunk_ids):
+    """
+    The chunk ids of the previous snapshot when size and mtime are unchanged and all chunks are still stored,
+    without reading the file; stat again since the manifest may come from the scan cache
+    """
+    st = os.stat(path)
+    if st.st_size != size or st.st_mtime != mtime or not all(c in self.store.known for c in chunk_ids):
+      return None
+    if self.progress is not None:
+      self.progress.set_file(path)
+      self.progress.add(size)
+    self.stats["files"] += 1
+    self.stats["reused_files"] += 1
+    self.stats["chunks"] += len(chunk_ids)
+    self.stats["logical_bytes"] += size
+    return size, mtime, chunk_ids
+
+  def dedup_ratio(self):
+    """Logical bytes per byte actually written in this run"""
+    if not self.stats["written_bytes"]:
+      return float("inf") if self.stats["logical_bytes"] else 1.0
+    return self.stats["logical_bytes"] / self.stats["written_bytes"]
+
+  def save(self, name):
+    """Write the snapshot manifest together with the statistics of the run"""
+    self.store.save_snapshot(name, {"folders": self.folders, "stats": self.stats})
+
+def restore_snapshot(store, name, target):
+  """Recreate all folders of a snapshot inside target"""
+  snapshot = store.load_snapshot(name)
+  for folder in snapshot["folders"]:
+    base = os.path.join(target, folder["arcname"])
+    for record in folder["entries"]:
+      entry = FileEntry(*record[:5])
+      path = os.path.join(base, entry.rel) if entry.rel else base
+      if entry.type == TYPE_DIR:
+        os.makedirs(path, exist_ok=True)
+      elif entry.type == TYPE_LINK:
+        if not os.path.lexists(path):
+          os.symlink(record[5], path)
+      else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+          for chunk_id in record[5]:
+            f.write(store.get(chunk_id))
+        os.utime(path, (entry.mtime, entry.mtime))
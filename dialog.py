@@ -8,40 +8,67 @@ Module: dialog.py
 Description: Draws the screens of the UI and calls classes to do the job
 '''
 
+import startup # first, it notes when the process started
 import tkinter as tk # UI
 from tkinter import ttk, messagebox # UI
-import subprocess # execute PowerShell scripts for hardware detection and to list standard folders in home catalog
 import threading # to unfreese the UI
-from report import Report # a class for step 1 -- get system info
+import os # cpu count for compression workers
+import multiprocessing # compression workers in the frozen executable
+import powershell # one PowerShell process for all commands
 from app_context import AppContext # filenames and other variables
-from backup import Backup # a class for step 2 -- define input/output folders and perform backup
 from i18n import _
+# report (pythoncom, wmi) and backup (the archiving engine) are imported when their screen opens
+startup.mark("imports")
 
 class Dialog():
   """Drawing main program windows"""
   def __init__(self):
+    self.backup = None
+    self.report = None
     self.context = AppContext()
+    startup.mark("tk window")
     self.home()
+    startup.mark("home screen")
+    self.context.root.after_idle(self.after_startup)
     self.context.run()
-    self.backup = None
-    self.report = None
+
+  def after_startup(self):
+    """The home window is drawn: print the startup timing if asked for"""
+    self.context.root.update_idletasks()
+    startup.mark("first frame")
+    startup.report()
 
   def is_powershell_installed(self):
     """
-    Check if PowerShell is installed
+    Check if PowerShell is installed, this starts the PowerShell process later commands reuse
     All the commands are tested for PS v.5
     """
     try:
-      subprocess.run(
-        ["powershell", "-Command", "Write-Output 'OK'"],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-        check=True
-        )
-      return True
-    except (FileNotFoundError, subprocess.CalledProcessError):
+      return powershell.run("Write-Output 'OK'") == ["OK"]
+    except powershell.PowerShellError:
       return False
 
+  def check_powershell(self, label):
+    """Probe PowerShell on a thread, the home screen shows the result when it's known"""
+    if self.context.powershell_installed is not None:
+      self.show_powershell(label)
+      return
+    def probe():
+      self.context.powershell_installed = self.is_powershell_installed()
+      self.context.root.after(0, lambda: self.show_powershell(label))
+    threading.Thread(target=probe, daemon=True).start()
+
+  def show_powershell(self, label):
+    """Tell if PowerShell is installed, without it the modes can't be chosen"""
+    if not label.winfo_exists():
+      return # the home screen was left meanwhile
+    if self.context.powershell_installed:
+      label.config(text=_("PowerShell is installed. We'll need it to do some stuff."))
+    else:
+      label.config(text=_("PowerShell is not installed. Please install it and restart the app."))
+      self.context.btn_novice_mode.config(state="disabled")
+      self.context.btn_expert_mode.config(state="disabled")
+
   def about(self):
     """About message box"""
     root = tk.Tk()
@@ -131,6 +158,8 @@ Bonus tip: All your data in Windows will be erased after installing Linux. :) So
     else:
       self.context.gen_label(_("Choose your folders to back up, and I'll create an archive in destination folder."))
 
+    from backup import Backup # pylint: disable=import-outside-toplevel
+    from compression import available_codecs # pylint: disable=import-outside-toplevel
     self.backup = Backup(self.context)
 
     # reserve frame for tar progress bar
@@ -153,10 +182,34 @@ Bonus tip: All your data in Windows will be erased after installing Linux. :) So
     checkbox = ttk.Checkbutton(dest_frame, text=_("Enable compression"), variable=check_var)
     checkbox.pack(padx=30, anchor="w")
 
+    self.choice_option(dest_frame, _("Codec (auto measures which is fastest for this destination):"), "codec",
+      ["auto"] + available_codecs())
+    self.int_option(dest_frame, _("Compression level (0 = codec default):"), "codec_level", 0, 19)
+    self.bool_option(dest_frame, _("Compress file by file, store photos, videos and archives as they are"), "per_file_compression")
+    self.bool_option(dest_frame, _("Incremental backup (only new and changed files)"), "incremental")
+    self.bool_option(dest_frame, _("Deduplicated store (duplicate files and repeated backups take no extra space)"), "dedup")
+    self.int_option(dest_frame, _("Compression workers:"), "compress_workers", 1, os.cpu_count() or 1)
+    self.int_option(dest_frame, _("Split into volumes of MB (0 = single file, 4095 for FAT32):"), "volume_size", 0, 1024 * 1024, 1024 * 1024)
+
+    self.bool_option(dest_frame, _("Low priority (keep the computer responsive while backing up)"), "low_priority")
+    self.int_option(dest_frame, _("Limit reading to MB/s (0 = no limit):"), "bandwidth_limit", 0, 10000, 1024 * 1024)
+
+    # exclusions change what is archived, so the folders are sized again
+    def resize():
+      self.backup.resize_folders(self.context)
+
+    self.bool_option(dest_frame, _("Skip caches, temporary files and other junk"), "exclude_junk", resize)
+    self.bool_option(dest_frame, _("Skip online-only OneDrive files instead of downloading them"), "skip_placeholders", resize)
+    self.list_option(dest_frame, _("Also skip (patterns separated by ;):"), "exclude_patterns", resize)
+    self.int_option(dest_frame, _("Skip files larger than MB (0 = no limit):"), "exclude_larger_than", 0, 1024 * 1024, 1024 * 1024, resize)
+    self.int_option(dest_frame, _("Skip files not changed for days (0 = no limit):"), "exclude_older_than", 0, 36500, on_change=resize)
+
     # 2. button_frame: set destination, add source
     choice_buttons = [
       (_("Set destination"), lambda: self.backup.set_destination(self.context), _("Here you set the folder, where to put your archive")),
-      (_("Add source folder"), lambda: self.backup.add_folder(self.context), _("Here you can add folders to the archive"))
+      (_("Add source folder"), lambda: self.backup.add_folder(self.context), _("Here you can add folders to the archive")),
+      (_("Verify archive"), lambda: self.backup.verify(self.context), _("Re-read an archive and compare it with the checksums saved next to it")),
+      (_("Estimate"), lambda: self.backup.estimate(self.context), _("Estimate the archive size and how long the backup takes with each codec"))
     ]
     self.context.gen_choice(choice_buttons)
 
@@ -181,6 +234,64 @@ Bonus tip: All your data in Windows will be erased after installing Linux. :) So
     ]
     self.context.gen_bbuttons(buttons)
 
+  def bool_option(self, parent, text, attr, on_change=None):
+    """Checkbox bound to a boolean context setting"""
+    var = tk.BooleanVar(value=getattr(self.context, attr))
+
+    def update_context(*_):
+      setattr(self.context, attr, var.get())
+      if on_change:
+        on_change()
+
+    var.trace_add("write", update_context)
+    ttk.Checkbutton(parent, text=text, variable=var).pack(padx=30, anchor="w")
+
+  def int_option(self, parent, text, attr, from_, to, unit=1, on_change=None):
+    """Labelled spinbox bound to an integer context setting, stored in multiples of unit"""
+    var = tk.IntVar(value=getattr(self.context, attr) // unit)
+
+    def update_context(*_):
+      try:
+        setattr(self.context, attr, max(from_, var.get()) * unit)
+      except tk.TclError: # empty or non-numeric input while typing
+        return
+      if on_change:
+        on_change()
+
+    var.trace_add("write", update_context)
+    frame = ttk.Frame(parent)
+    frame.pack(padx=30, anchor="w")
+    ttk.Label(frame, text=text).pack(side="left")
+    ttk.Spinbox(frame, from_=from_, to=to, width=8, textvariable=var).pack(side="left", padx=5)
+
+  def choice_option(self, parent, text, attr, values):
+    """Labelled read-only combobox bound to a string context setting"""
+    var = tk.StringVar(value=getattr(self.context, attr))
+
+    def update_context(*_):
+      setattr(self.context, attr, var.get())
+
+    var.trace_add("write", update_context)
+    frame = ttk.Frame(parent)
+    frame.pack(padx=30, anchor="w")
+    ttk.Label(frame, text=text).pack(side="left")
+    ttk.Combobox(frame, values=values, width=8, state="readonly", textvariable=var).pack(side="left", padx=5)
+
+  def list_option(self, parent, text, attr, on_change=None):
+    """Labelled entry bound to a list context setting, items separated by ;"""
+    var = tk.StringVar(value="; ".join(getattr(self.context, attr)))
+
+    def update_context(*_):
+      setattr(self.context, attr, [item.strip() for item in var.get().split(";") if item.strip()])
+      if on_change:
+        on_change()
+
+    var.trace_add("write", update_context)
+    frame = ttk.Frame(parent)
+    frame.pack(padx=30, anchor="w")
+    ttk.Label(frame, text=text).pack(side="left")
+    ttk.Entry(frame, width=40, textvariable=var).pack(side="left", padx=5)
+
   def start_backup(self):
     """A function to call backup method with context argument"""
     self.backup.start_backup(self.context)
@@ -206,6 +317,7 @@ Bonus tip: All your data in Windows will be erased after installing Linux. :) So
       self.context.set_report_label(_("Now we are gathering software and hardware info"))
       state = "disabled"
       self.context.start_progress()
+      from report import Report # pylint: disable=import-outside-toplevel
       self.report = Report()
       threading.Thread(target=lambda: self.report.get_info_thread(self.context), daemon=True).start()
     else:
@@ -290,16 +402,8 @@ When you click 'Next', we'll gather information about your software and hardware
     ]
     self.context.gen_choice(choice_buttons)
 
-    # PowerShell check
-    text_ps_installed = _("PowerShell is installed. We'll need it to do some stuff.")
-    text_ps_not_installed = _("PowerShell is not installed. Please install it and restart the app.")
-
-    if self.is_powershell_installed():
-      self.context.gen_label(text_ps_installed)
-    else:
-      self.context.gen_label(text_ps_not_installed)
-      self.context.btn_novice_mode.config(state="disabled")
-      self.context.btn_expert_mode.config(state="disabled")
+    # PowerShell check, starting powershell takes a while
+    self.check_powershell(self.context.gen_label(_("Checking PowerShell…")))
     self.context.gen_label(_("This project is licensed under the GNU General Public License v3.0 or later. Press 'About' for more details."))
     about_button = ttk.Button(self.context.root, text=_("About"), command=self.about)
     about_button.pack(pady=0)
@@ -307,4 +411,6 @@ When you click 'Next', we'll gather information about your software and hardware
 
     self.context.gen_label(_("Thanks to all the guys and gals in reddit.com/r/linuxsucks/, you're my inspiration."))
 
-dialog = Dialog()
+if __name__ == "__main__":
+  multiprocessing.freeze_support() # worker processes re-launch the executable
+  dialog = Dialog()
@@ -0,0 +1,121 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: estimator.py
+Description: Dry run of a backup: expected archive size, destination free space and duration for every codec
+'''
+
+import io
+import os
+import random
+import shutil
+import tarfile
+from compression import CODECS
+from calibration import sample_files, measure_pieces, measure_write_speed
+from member_codec import should_compress
+from scanner import TYPE_FILE
+
+FILES_PER_TYPE = 4 # sampled files of every extension
+SAMPLE_TYPES = 24 # extensions with the most bytes are sampled, the rest get the average ratio
+SAMPLE_CHUNK = 128 * 1024 # bytes read from each sampled file
+CODEC_TIME_BUDGET = 0.5 # seconds of compression per codec, slow codecs measure fewer types
+WRITE_TEST_SIZE = 8 * 1024 * 1024
+
+def file_type(rel):
+  """Extension a file is grouped by, "" for files without one"""
+  return os.path.splitext(rel)[1].lower()
+
+def group_by_type(plan):
+  """{extension: [(manifest, entry), ...]} of the files to archive, plan is a list of (manifest, entries)"""
+  types = {}
+  for manifest, entries in plan:
+    for entry in entries:
+      if entry.type == TYPE_FILE:
+        types.setdefault(file_type(entry.rel), []).append((manifest, entry))
+  return types
+
+def sample_types(types, per_type=FILES_PER_TYPE, max_types=SAMPLE_TYPES, chunk=SAMPLE_CHUNK):
+  """
+  [(extension, bytes, samples)] for the extensions holding the most data, largest first;
+  samples of every extension are taken like calibration samples the sources, see calibration.sample_files
+  """
+  rng = random.Random(0) # the same sources give the same estimate
+  sizes = {ext: sum(entry.size for _, entry in files) for ext, files in types.items()}
+  sampled = []
+  for ext in sorted(sizes, key=sizes.get, reverse=True)[:max_types]:
+    files = [(manifest, entry) for manifest, entry in types[ext] if entry.size > 0]
+    samples = sample_files(files, per_type, rng, chunk) if files else []
+    if samples:
+      sampled.append((ext, sizes[ext], samples))
+  return sampled
+
+def measure_types(codec, level, sampled, per_file, budget=CODEC_TIME_BUDGET):
+  """
+  (bytes per second on one core, {extension: compressed/original ratio}, share of the bytes going through
+  the codec) within a time budget; with per-file compression the files that would be stored count with ratio 1
+  """
+  groups = []
+  stored = []
+  for _, _, samples in sampled:
+    pieces = [data for name, size, data in samples if not per_file or should_compress(name, size, io.BytesIO(data))]
+    groups.append(pieces)
+    stored.append(sum(len(data) for _, _, data in samples) - sum(len(piece) for piece in pieces))
+  speed, measured = measure_pieces(codec, level, groups, budget)
+  ratios = {}
+  done = seen = 0
+  for (ext, _, _), (original, compressed), kept in zip(sampled, measured, stored):
+    ratios[ext] = (compressed + kept) / max(original + kept, 1)
+    done += original
+    seen += original + kept
+  return speed, ratios, done / max(seen, 1)
+
+def tar_size(plan):
+  """Size of the uncompressed tar: a header per entry, file data padded to blocks, the end of archive"""
+  size = 2 * tarfile.BLOCKSIZE
+  for _, entries in plan:
+    for entry in entries:
+      size += tarfile.BLOCKSIZE
+      if entry.type == TYPE_FILE:
+        size += -(-entry.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+  return size
+
+def free_space(destination):
+  """Free bytes on the destination drive"""
+  return shutil.disk_usage(destination).free
+
+def estimate(plan, destination, workers=1, per_file=False, codecs=None):
+  """
+  Expected archive size and duration without compression and with every available codec at its default level;
+  compressing and writing overlap, so a run takes as long as the slower of the two
+  """
+  types = group_by_type(plan)
+  data_size = sum(entry.size for files in types.values() for _, entry in files)
+  overhead = tar_size(plan) - data_size # headers and padding, they compress to almost nothing
+  sampled = sample_types(types)
+  sampled_size = sum(size for _, size, _ in sampled)
+  write_speed = measure_write_speed(destination, WRITE_TEST_SIZE)
+  free = free_space(destination)
+
+  results = [{"codec": None, "level": None, "ratio": 1.0, "size": data_size + overhead,
+              "seconds": (data_size + overhead) / write_speed}]
+  names = codecs if codecs is not None else list(CODECS)
+  for name in names:
+    codec = CODECS[name]
+    if not codec.available or not sampled:
+      continue
+    speed, ratios, share = measure_types(codec, codec.default_level, sampled, per_file)
+    measured = sum(size for ext, size, _ in sampled if ext in ratios)
+    average = sum(ratios[ext] * size for ext, size, _ in sampled if ext in ratios) / max(measured, 1)
+    compressed = sum(size * ratios.get(ext, average) for ext, size, _ in sampled)
+    compressed += (data_size - sampled_size) * average
+    size = int(compressed) + (overhead if per_file else 0)
+    compress_time = data_size * share / (max(speed, 1) * max(1, workers))
+    results.append({"codec": name, "level": codec.default_level, "ratio": size / max(data_size + overhead, 1),
+                    "size": size, "seconds": max(compress_time, size / write_speed)})
+  for result in results:
+    result["fits"] = result["size"] <= free
+  return {"files": sum(len(files) for files in types.values()), "data_size": data_size, "free": free,
+          "write_speed": write_speed, "types": len(types), "sampled_types": len(sampled), "estimates": results}
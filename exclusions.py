@@ -0,0 +1,92 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: exclusions.py
+Description: Exclusion rules (globs, size, age, presets) compiled into one matcher the scanner prunes with
+'''
+
+import os
+import re
+import time
+import fnmatch
+from scanner import TYPE_DIR, TYPE_FILE
+
+# Patterns without "/" match a name at any depth, with "/" the path relative to the source folder;
+# a trailing "/" matches folders only. Matching ignores case like Windows does.
+PRESETS = {
+  "system": ["$RECYCLE.BIN/", "System Volume Information/", "Thumbs.db", "ehthumbs.db", "desktop.ini"],
+  "temp": ["*AppData/Local/Temp/", "*.tmp", "~$*", "*.crdownload", "*.part"], # the user's Temp, not any folder named so
+  "browser_cache": ["Cache_Data/", "Code Cache/", "GPUCache/", "ShaderCache/", "GrShaderCache/",
+                    "cache2/", "INetCache/", "CacheStorage/"],
+  "development": ["node_modules/", "__pycache__/", "*.pyc", ".pytest_cache/", ".mypy_cache/", ".tox/",
+                  ".gradle/", ".vs/"],
+}
+DEFAULT_PRESETS = ("system", "temp", "browser_cache", "development")
+
+# online-only OneDrive and other cloud files: reading them downloads them first
+FILE_ATTRIBUTE_OFFLINE = 0x1000
+FILE_ATTRIBUTE_RECALL_ON_OPEN = 0x40000
+FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS = 0x400000
+PLACEHOLDER_ATTRIBUTES = FILE_ATTRIBUTE_OFFLINE | FILE_ATTRIBUTE_RECALL_ON_OPEN | FILE_ATTRIBUTE_RECALL_ON_DATA_ACCESS
+
+class ExclusionRules():
+  """User-facing exclusion settings"""
+  def __init__(self, presets=(), patterns=(), max_size=0, max_age_days=0, skip_placeholders=False):
+    self.presets = sorted(presets)
+    self.patterns = [p.strip() for p in patterns if p.strip()]
+    self.max_size = max_size # bytes, 0 - no limit
+    self.max_age_days = max_age_days # 0 - no limit
+    self.skip_placeholders = skip_placeholders
+
+  def signature(self):
+    """The rules as plain data: a scan, index or checkpoint made with other rules is not reused"""
+    presets = {preset: PRESETS.get(preset, []) for preset in self.presets} # a changed preset counts as other rules
+    return [presets, self.patterns, self.max_size, self.max_age_days, self.skip_placeholders]
+
+  def compile(self):
+    """Matcher for these rules, its age limit counts from now"""
+    return Matcher(self)
+
+class Matcher():
+  """All glob patterns joined into two regular expressions, plus size, age and cloud placeholder checks"""
+  def __init__(self, rules: ExclusionRules):
+    self.signature = rules.signature()
+    patterns = [p for preset in rules.presets for p in PRESETS.get(preset, [])] + rules.patterns
+    self.any_name = self.join([p for p in patterns if "/" not in p.rstrip("/") and not p.endswith("/")])
+    self.dir_name = self.join([p.rstrip("/") for p in patterns if "/" not in p.rstrip("/") and p.endswith("/")])
+    self.any_path = self.join([p.lstrip("/") for p in patterns if "/" in p.rstrip("/") and not p.endswith("/")])
+    self.dir_path = self.join([p.strip("/") for p in patterns if "/" in p.rstrip("/") and p.endswith("/")])
+    self.max_size = rules.max_size
+    self.cutoff = time.time() - rules.max_age_days * 86400 if rules.max_age_days else None
+    self.skip_placeholders = rules.skip_placeholders
+
+  def join(self, patterns):
+    """One case-insensitive regex for a list of globs, None if there are none"""
+    if not patterns:
+      return None
+    return re.compile("|".join(fnmatch.translate(p) for p in patterns), re.IGNORECASE)
+
+  def excludes(self, entry, attributes=0):
+    """Check a manifest entry, a folder that is excluded is not descended into"""
+    if entry.type == TYPE_FILE:
+      if self.max_size and entry.size > self.max_size:
+        return True
+      if self.cutoff is not None and entry.mtime < self.cutoff:
+        return True
+      if self.skip_placeholders and attributes & PLACEHOLDER_ATTRIBUTES:
+        return True
+    name = os.path.basename(entry.rel)
+    path = entry.rel.replace(os.sep, "/")
+    if self.any_name is not None and self.any_name.match(name):
+      return True
+    if self.any_path is not None and self.any_path.match(path):
+      return True
+    if entry.type == TYPE_DIR:
+      if self.dir_name is not None and self.dir_name.match(name):
+        return True
+      if self.dir_path is not None and self.dir_path.match(path):
+        return True
+    return False
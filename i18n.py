@@ -17,10 +17,12 @@ def resource_path(relative_path):
   """Get path to resource, whether running as script or bundled with PyInstaller"""
   if hasattr(sys, '_MEIPASS'):
     return os.path.join(sys._MEIPASS, relative_path)
-  return os.path.abspath(relative_path)
+  return os.path.join(os.path.dirname(os.path.abspath(__file__)), relative_path) # any working directory
 
 def get_display_language():
-  """Get the Windows display/UI language (first in preferred list)"""
+  """Get the Windows display/UI language (first in preferred list), None elsewhere"""
+  if os.name != "nt":
+    return None # gettext reads LANGUAGE, LC_ALL, LC_MESSAGES and LANG
   preferred_lang = ctypes.windll.kernel32.GetUserPreferredUILanguages
   lang_name = 0x8
   num_languages = ctypes.c_ulong()
@@ -34,7 +36,7 @@ locales_path = resource_path("locales")
 lang_code = get_display_language()
 
 try:
-  translation = gettext.translation('messages', localedir=locales_path, languages=[lang_code])
+  translation = gettext.translation('messages', localedir=locales_path, languages=[lang_code] if lang_code else None)
   _ = translation.gettext
 except FileNotFoundError:
   _ = gettext.gettext
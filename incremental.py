@@ -0,0 +1,158 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: incremental.py
+Description: Persistent file index for incremental backups and rebuilding the full state from a chain
+'''
+
+import os
+import json
+import shutil
+from scanner import FileEntry, TYPE_DIR
+from volumes import open_archive
+from member_codec import extract_member
+
+INDEX_FILENAME = "lmtk_index.json"
+DELETED_MEMBER = ".lmtk/deleted.json" # first member of every incremental archive
+MAX_CHAIN = 7 # a full backup after this many archives, it also re-checks files edited in place
+
+class BackupIndex():
+  """
+  State of the last backup in the destination folder: archives of the current chain and
+  type, size, mtime and mode of every backed up entry, keyed by source folder and relative path
+  """
+  def __init__(self, destination):
+    self.destination = destination
+    self.chain = [] # [{"archive": filename, "deleted": [arcname, ...]}], oldest first
+    self.folders = {} # root -> {"arcname": str, "entries": {rel: [type, size, mtime, mode]}}
+    self.exclusions = None # signature of the exclusion rules the chain was made with
+
+  @property
+  def path(self):
+    """Index file location"""
+    return os.path.join(self.destination, INDEX_FILENAME)
+
+  def load(self):
+    """Read the index, a missing or broken one means the next backup is full"""
+    try:
+      with open(self.path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+      self.chain = data["chain"]
+      self.folders = data["folders"]
+      self.exclusions = data.get("exclusions")
+    except (OSError, ValueError, KeyError):
+      self.reset()
+    return self
+
+  def save(self):
+    """Write the index atomically, so a crash never leaves a half-written one"""
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+      json.dump({"chain": self.chain, "folders": self.folders, "exclusions": self.exclusions}, f, separators=(",", ":"))
+    os.replace(tmp_path, self.path)
+
+  def reset(self):
+    """Forget the chain, the next archive is a full backup"""
+    self.chain = []
+    self.folders = {}
+    self.exclusions = None
+
+  def needs_full(self, max_chain=MAX_CHAIN):
+    """No chain yet or the chain is long enough to start over"""
+    return not self.chain or len(self.chain) >= max_chain
+
+  def previous_tree(self, root):
+    """Children of every recorded folder for Scanner.scan(previous=...)"""
+    entries = self.folders.get(root, {}).get("entries", {})
+    tree = {}
+    for rel, (entry_type, _, mtime, _) in entries.items():
+      if entry_type == TYPE_DIR:
+        tree.setdefault(rel, [mtime, []])[0] = mtime
+    for rel, record in entries.items():
+      if rel:
+        parent = tree.get(os.path.dirname(rel))
+        if parent is not None:
+          parent[1].append(FileEntry(rel, *record))
+    return {rel: (mtime, sorted(children)) for rel, (mtime, children) in tree.items()}
+
+  def diff(self, manifest):
+    """New and changed entries of a manifest and arcnames of entries removed since the last run"""
+    known = self.folders.get(manifest.root, {}).get("entries", {})
+    unreadable = self.unreadable_rels(manifest)
+    changed = []
+    current = set()
+    deleted = []
+    for entry in manifest.entries:
+      current.add(entry.rel)
+      record = known.get(entry.rel)
+      if record is None or record[0] != entry.type or record[1] != entry.size or record[2] != entry.mtime:
+        changed.append(entry)
+        if record is not None and record[0] != entry.type: # replaced by another type, remove the old one first
+          deleted.append(manifest.arcname_of(entry.rel))
+    for rel in known:
+      if rel not in current and not self.is_under(rel, unreadable):
+        deleted.append(manifest.arcname_of(rel))
+    return changed, deleted
+
+  def deleted_folders(self, roots):
+    """Arcnames of source folders that were removed from the list since the last run"""
+    return [folder["arcname"] for root, folder in self.folders.items() if root not in roots]
+
+  def record(self, archive_name, manifests, deleted, failed_paths=()):
+    """Remember the archive and the new state, entries that failed keep their old state and are retried"""
+    folders = {}
+    for manifest in manifests:
+      known = self.folders.get(manifest.root, {}).get("entries", {})
+      entries = {}
+      for entry in manifest.entries:
+        if manifest.path(entry.rel) in failed_paths:
+          if entry.rel in known:
+            entries[entry.rel] = known[entry.rel]
+        else:
+          entries[entry.rel] = [entry.type, entry.size, entry.mtime, entry.mode]
+      unreadable = self.unreadable_rels(manifest)
+      for rel, record in known.items(): # folders that could not be listed this time stay as they were
+        if rel not in entries and self.is_under(rel, unreadable):
+          entries[rel] = record
+      folders[manifest.root] = {"arcname": manifest.arcname, "entries": entries}
+    self.folders = folders
+    self.chain.append({"archive": archive_name, "deleted": deleted})
+
+  def unreadable_rels(self, manifest):
+    """Relative paths of folders the scanner could not list"""
+    return [os.path.relpath(path, manifest.root) if path != manifest.root else "" for path, _ in manifest.errors]
+
+  def is_under(self, rel, parents):
+    """Check if a relative path is inside (or equal to) one of the folders"""
+    return any(not parent or rel == parent or rel.startswith(parent + os.sep) for parent in parents)
+
+def apply_archive(archive_path, target):
+  """Apply one archive of a chain: remove what it lists as deleted, then extract its content"""
+  with open_archive(archive_path) as tar:
+    for member in tar:
+      if member.name == DELETED_MEMBER:
+        for arcname in json.loads(tar.extractfile(member).read()):
+          remove_path(target, arcname)
+      else:
+        extract_member(tar, member, target)
+
+def remove_path(target, arcname):
+  """Remove a file or a folder tree inside the target, never outside of it"""
+  target = os.path.abspath(target)
+  path = os.path.abspath(os.path.join(target, *arcname.split("/")))
+  if not path.startswith(target + os.sep):
+    return
+  if os.path.isdir(path) and not os.path.islink(path):
+    shutil.rmtree(path, ignore_errors=True)
+  elif os.path.lexists(path):
+    os.remove(path)
+
+def rebuild_from_chain(destination, target):
+  """Rebuild the state of the last backup in target from the full archive and its incrementals"""
+  index = BackupIndex(destination).load()
+  for link in index.chain:
+    apply_archive(os.path.join(destination, link["archive"]), target)
+  return [link["archive"] for link in index.chain]
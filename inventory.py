@@ -0,0 +1,46 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: inventory.py
+Description: Records the report collectors return: installed applications and hardware devices
+'''
+
+from datetime import datetime
+from collections import namedtuple
+
+# size in bytes, publisher, version and size are None when Windows doesn't know them
+App = namedtuple("App", ["name", "publisher", "version", "size", "source"])
+SOURCE_STANDARD = "standard" # registered for uninstall
+SOURCE_STORE = "store" # Microsoft Store package
+
+# details maps a property (cores, size, free, connection_id, type, port) to its value, sizes are in bytes
+Device = namedtuple("Device", ["device_class", "name", "details"])
+DEVICE_CLASSES = ["cpu", "ram", "drive", "gpu", "network", "printer", "scanner"] # in report order
+
+class Inventory():
+  """Everything the report shows, as collected"""
+  def __init__(self, generated=None):
+    self.generated = generated or datetime.now()
+    self.standard_apps = []
+    self.store_apps = []
+    self.devices = []
+    self.partial = {} # device class -> WMI error, None if WMI didn't answer in time
+    self.timings = {} # device class -> seconds its WMI query took, only for collected hardware
+
+  def devices_of(self, device_class):
+    """Devices of one class, in the order they were found"""
+    return [device for device in self.devices if device.device_class == device_class]
+
+  def to_dict(self):
+    """Plain data for the JSON report"""
+    return {
+      "generated": self.generated.isoformat(timespec="seconds"),
+      "standard_apps": [app._asdict() for app in self.standard_apps],
+      "store_apps": [app._asdict() for app in self.store_apps],
+      "devices": [device._asdict() for device in self.devices],
+      "partial": self.partial,
+      "timings": self.timings,
+    }
@@ -0,0 +1,65 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: inventory_cache.py
+Description: Inventory sections of the last report with the change tokens they were collected at
+'''
+
+import os
+import json
+from inventory import App, Device
+
+CACHE_FILENAME = "inventory_cache.json"
+CACHE_VERSION = 1 # a cache written with other record fields is ignored
+SECTION_RECORDS = {"standard_apps": App, "store_apps": App, "devices": Device}
+
+def default_cache_dir():
+  """LMTK in the local application data, ~/.cache/LMTK where there is none"""
+  return os.path.join(os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache"), "LMTK")
+
+class InventoryCache():
+  """Records of every section and its token, a section is reused while its token stays the same"""
+  def __init__(self, cache_dir=None):
+    self.cache_dir = cache_dir or default_cache_dir()
+    self.sections = {} # section -> {"token": str, "records": [[field, ...], ...]}
+
+  @property
+  def path(self):
+    """Cache file location"""
+    return os.path.join(self.cache_dir, CACHE_FILENAME)
+
+  def load(self):
+    """Read the cache, a missing or broken one is empty"""
+    try:
+      with open(self.path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+      self.sections = data["sections"] if data.get("version") == CACHE_VERSION else {}
+    except (OSError, ValueError, KeyError):
+      self.sections = {}
+    return self
+
+  def save(self):
+    """Write the cache atomically"""
+    os.makedirs(self.cache_dir, exist_ok=True)
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+      json.dump({"version": CACHE_VERSION, "sections": self.sections}, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, self.path)
+
+  def get(self, section, token):
+    """Cached records of a section collected at this token, None if it has to be collected"""
+    cached = self.sections.get(section)
+    if token is None or cached is None or cached["token"] != token:
+      return None
+    try:
+      return [SECTION_RECORDS[section](*fields) for fields in cached["records"]]
+    except TypeError: # written by another version
+      return None
+
+  def put(self, section, token, records):
+    """Remember the records of a section, records without a token leave the cache as it is"""
+    if token is not None:
+      self.sections[section] = {"token": token, "records": [list(record) for record in records]}
@@ -0,0 +1,181 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: lmtk.py
+Description: Command line without the UI: python -m lmtk backup|report, progress as JSON lines on stdout
+'''
+
+import os
+import sys
+import json
+import argparse
+import threading
+import contextlib
+import tarfile
+import multiprocessing # compression workers in the frozen executable
+from backup_settings import BackupSettings
+from backup_engine import BackupEngine
+from compression import available_codecs
+from throttle import BackupControl, BackupCancelled, lower_thread_priority
+
+MB = 1024 * 1024
+
+class JsonLines():
+  """Writes events as one JSON object per line, from any thread"""
+  def __init__(self, stream):
+    self.stream = stream
+    self._lock = threading.Lock()
+
+  def emit(self, event, **fields):
+    """Write and flush one event"""
+    with self._lock:
+      self.stream.write(json.dumps({"event": event, **fields}, ensure_ascii=False, default=str) + "\n")
+      self.stream.flush()
+
+def backup_settings(args, engine):
+  """Fill the engine settings from the command line"""
+  settings = engine.settings
+  settings.backup_input = [engine.folder_info(path) for path in args.sources]
+  settings.backup_output = os.path.normpath(args.destination)
+  settings.compress = args.codec != "none"
+  settings.codec = args.codec if args.codec != "none" else "auto"
+  settings.codec_level = args.level
+  settings.per_file_compression = args.per_file
+  settings.compress_workers = args.workers
+  settings.incremental = args.incremental
+  settings.dedup = args.dedup
+  settings.volume_size = args.volume_size * MB
+  settings.exclude_junk = args.skip_junk
+  settings.skip_placeholders = args.skip_placeholders
+  settings.exclude_patterns = args.exclude
+  settings.exclude_larger_than = args.larger_than * MB
+  settings.exclude_older_than = args.older_than
+  settings.bandwidth_limit = args.limit * MB
+  settings.low_priority = args.low_priority
+
+def run_in_thread(work, control=None):
+  """
+  Run work() on a thread so Ctrl+C in the main thread can cancel it through the control;
+  return its result or raise its exception
+  """
+  outcome = {}
+  finished = threading.Event() # Thread.join interrupted by Ctrl+C may wrongly report the thread as stopped
+  def target():
+    try:
+      outcome["result"] = work()
+    except BaseException as e: # pylint: disable=broad-exception-caught
+      outcome["error"] = e
+    finally:
+      finished.set()
+  threading.Thread(target=target, daemon=True).start()
+  try:
+    while not finished.wait(0.2):
+      pass
+  except KeyboardInterrupt:
+    if control is None:
+      raise
+    control.cancel() # the engine removes what it has written
+    finished.wait()
+  if "error" in outcome:
+    raise outcome["error"]
+  return outcome["result"]
+
+def backup(args, out):
+  """Back up the sources, or with --dry-run only estimate the backup"""
+  engine = BackupEngine(BackupSettings(),
+    on_progress=lambda info: out.emit("progress", **info),
+    on_status=lambda text: out.emit("status", text=text))
+  backup_settings(args, engine)
+  error_code = engine.validate_backup_paths()
+  if error_code != 0:
+    out.emit("error", message=engine.path_error(error_code))
+    return 1
+
+  if args.dry_run:
+    work = engine.estimate
+  else:
+    engine.settings.backup_control = BackupControl(engine.settings.bandwidth_limit)
+    def work():
+      if args.low_priority:
+        lower_thread_priority()
+      return engine.run()
+  try:
+    result = run_in_thread(work, engine.settings.backup_control)
+  except BackupCancelled:
+    out.emit("cancelled")
+    return 130
+  except (OSError, tarfile.TarError) as e:
+    out.emit("error", message=str(e))
+    return 1
+  out.emit("done", **result)
+  return 0
+
+def report(args, out):
+  """Gather the hardware and software report, Windows only"""
+  from report import Report # pylint: disable=import-outside-toplevel
+  from powershell import PowerShellError # pylint: disable=import-outside-toplevel
+  from probes import RecordingProbe, ReplayProbe, ProbeError # pylint: disable=import-outside-toplevel
+  try:
+    if args.replay:
+      probe = ReplayProbe(args.replay)
+    elif args.record:
+      probe = RecordingProbe(args.record)
+    else:
+      probe = None
+    with contextlib.redirect_stdout(sys.stderr): # stdout carries only events
+      markdown_path, html_path, json_path = run_in_thread(
+        lambda: Report(args.output, use_cache=not args.no_cache, probe=probe).generate(
+          lambda text: out.emit("status", text=text)))
+  except (OSError, ImportError, PowerShellError, ProbeError) as e: # pythoncom and wmi exist only on Windows
+    out.emit("error", message=str(e))
+    return 1
+  out.emit("done", markdown=markdown_path, html=html_path, json=json_path)
+  return 0
+
+def main(argv=None):
+  """Command line: python -m lmtk backup SOURCE... -d DESTINATION | python -m lmtk report"""
+  parser = argparse.ArgumentParser(prog="lmtk", description="LMTK without the UI, progress as JSON lines on stdout")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  backup_parser = commands.add_parser("backup", help="back up folders into an archive in the destination")
+  backup_parser.add_argument("sources", nargs="+", help="folders to back up")
+  backup_parser.add_argument("-d", "--destination", required=True, help="folder to write the archive to")
+  backup_parser.add_argument("-c", "--codec", default="auto", choices=["auto", "none", *available_codecs()],
+    help="compression, auto measures which is fastest for this destination")
+  backup_parser.add_argument("--level", type=int, default=0, help="compression level, 0 - codec default")
+  backup_parser.add_argument("--per-file", action="store_true",
+    help="compress file by file in a plain tar and store photos, videos and archives as they are")
+  backup_parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="compression processes")
+  backup_parser.add_argument("--incremental", action="store_true", help="only new and changed files")
+  backup_parser.add_argument("--dedup", action="store_true", help="deduplicated store instead of a tar archive")
+  backup_parser.add_argument("--volume-size", type=int, default=0, metavar="MB", help="split into volumes")
+  backup_parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN", help="also skip these")
+  backup_parser.add_argument("--skip-junk", action="store_true", help="skip caches, temporary files and other junk")
+  backup_parser.add_argument("--skip-placeholders", action="store_true",
+    help="skip online-only OneDrive and other cloud files instead of downloading them")
+  backup_parser.add_argument("--larger-than", type=int, default=0, metavar="MB", help="skip larger files")
+  backup_parser.add_argument("--older-than", type=int, default=0, metavar="DAYS", help="skip older files")
+  backup_parser.add_argument("--limit", type=int, default=0, metavar="MB/S", help="limit reading speed")
+  backup_parser.add_argument("--low-priority", action="store_true", help="background CPU and I/O priority")
+  backup_parser.add_argument("--dry-run", action="store_true",
+    help="only estimate the archive size and duration for every codec")
+  backup_parser.set_defaults(handler=backup)
+
+  report_parser = commands.add_parser("report", help="hardware and software report as Markdown, html and JSON")
+  report_parser.add_argument("-o", "--output", metavar="FOLDER", help="where to write it, default: Documents/LMTK")
+  report_parser.add_argument("--no-cache", action="store_true",
+    help="collect every section again, not only those that changed since the last report")
+  probe_options = report_parser.add_mutually_exclusive_group()
+  probe_options.add_argument("--record", metavar="FIXTURE", help="also write the raw PowerShell and WMI outputs here")
+  probe_options.add_argument("--replay", metavar="FIXTURE", help="use recorded outputs instead of this machine, any OS")
+  report_parser.set_defaults(handler=report)
+
+  args = parser.parse_args(argv)
+  return args.handler(args, JsonLines(sys.stdout))
+
+if __name__ == "__main__":
+  multiprocessing.freeze_support() # worker processes re-launch the executable
+  sys.exit(main())
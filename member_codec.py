@@ -0,0 +1,130 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: member_codec.py
+Description: Per-file compression inside a plain tar: deciding what to compress, writing and reading such members
+'''
+
+import os
+import zlib
+import shutil
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from compression import ParallelBlockWriter, get_codec
+
+# A compressed member is stored as <name>.<codec extension> with these pax headers, so any tar tool
+# still extracts a valid .bz2/.xz/.zst/.lz4 file and LMTK restores the original name and content
+CODEC_HEADER = "LMTK.codec"
+SIZE_HEADER = "LMTK.size"
+
+# formats that are compressed already: photos, audio, video, archives, installers, office documents
+STORED_EXTENSIONS = frozenset("""
+  .jpg .jpeg .png .gif .webp .heic .heif .avif .jxl
+  .mp3 .m4a .aac .ogg .oga .opus .flac .wma
+  .mp4 .m4v .mkv .mov .avi .wmv .webm .3gp
+  .zip .7z .rar .gz .tgz .bz2 .xz .zst .lz4 .cab .msi .msix .appx .jar .apk .iso .dmg
+  .docx .xlsx .pptx .odt .ods .odp .epub
+""".split())
+SAMPLE_SIZE = 64 * 1024 # first blocks checked for files with an unknown extension
+MIN_COMPRESS_SIZE = 1024 # smaller files fit in a couple of tar blocks anyway
+INCOMPRESSIBLE_RATIO = 0.9 # a sample that fast deflate can't shrink by 10% is treated as random data
+COPY_SIZE = 1024 * 1024
+
+def should_compress(name, size, fileobj):
+  """
+  Decide by extension, then by how well a fast deflate pass shrinks a sample of the first blocks;
+  fileobj is the file opened for reading, its position is left at the start
+  """
+  if size < MIN_COMPRESS_SIZE or os.path.splitext(name)[1].lower() in STORED_EXTENSIONS:
+    return False
+  sample = fileobj.read(SAMPLE_SIZE)
+  fileobj.seek(0)
+  return len(zlib.compress(sample, 1)) < len(sample) * INCOMPRESSIBLE_RATIO
+
+class MemberCompressor():
+  """Compresses single files on one process pool shared by all members"""
+  def __init__(self, workers=None, level=None, codec="bz2", initializer=None, on_wait=None):
+    self.workers = max(1, workers or os.cpu_count() or 1)
+    self.codec = get_codec(codec)
+    self.level = level
+    self.on_wait = on_wait
+    self._executor = None
+    if self.workers > 1:
+      self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initializer)
+
+  def compress(self, reader, output):
+    """Read a file to the end and write it to output compressed, large files block-parallel"""
+    with ParallelBlockWriter(output, self.workers, level=self.level, executor=self._executor,
+                             codec=self.codec.name, on_wait=self.on_wait) as writer:
+      shutil.copyfileobj(reader, writer, COPY_SIZE)
+
+  def close(self):
+    """Stop the pool"""
+    if self._executor is not None:
+      self._executor.shutdown()
+
+  def abort(self):
+    """Stop the pool without waiting for blocks being compressed"""
+    if self._executor is not None:
+      self._executor.shutdown(wait=False, cancel_futures=True)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    if exc_type is None:
+      self.close()
+    else:
+      self.abort()
+
+def mark_compressed(info, original_size, codec):
+  """Turn the header of a file into the header of its compressed member"""
+  info.name += "." + codec.extension
+  info.pax_headers = {CODEC_HEADER: codec.name, SIZE_HEADER: str(original_size)}
+
+def is_compressed(member):
+  """Check if a member holds a separately compressed file"""
+  return CODEC_HEADER in member.pax_headers
+
+def member_codec(member):
+  """Codec of a separately compressed member"""
+  return get_codec(member.pax_headers[CODEC_HEADER])
+
+def original_name(member):
+  """Name of the archived file, without the suffix of a compressed member"""
+  if is_compressed(member):
+    suffix = "." + member_codec(member).extension
+    if member.name.endswith(suffix):
+      return member.name[:-len(suffix)]
+  return member.name
+
+def original_size(member):
+  """Size of the archived file before per-file compression"""
+  if is_compressed(member):
+    return int(member.pax_headers.get(SIZE_HEADER, member.size))
+  return member.size
+
+def open_member(tar, member):
+  """Readable file object with the original content of a file member"""
+  if is_compressed(member):
+    return member_codec(member).reader(tar.extractfile(member))
+  return tar.extractfile(member)
+
+def extract_member(tar, member, target):
+  """tar.extract with the "data" filter that also restores separately compressed files"""
+  if not (member.isfile() and is_compressed(member)):
+    tar.extract(member, target, filter="data")
+    return
+  info = tarfile.data_filter(member.replace(name=original_name(member), deep=False), target)
+  path = os.path.join(target, info.name)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  if os.path.lexists(path):
+    os.remove(path)
+  with open_member(tar, member) as src, open(path, "wb") as dst:
+    shutil.copyfileobj(src, dst, COPY_SIZE)
+  if info.mode is not None:
+    os.chmod(path, info.mode)
+  os.utime(path, (info.mtime, info.mtime))
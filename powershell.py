@@ -0,0 +1,189 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: powershell.py
+Description: One long-lived PowerShell process runs all PowerShell commands, results come back as delimited JSON
+'''
+
+import os
+import json
+import time
+import queue
+import atexit
+import base64
+import itertools
+import threading
+import subprocess
+import collections
+
+DEFAULT_TIMEOUT = 60 # seconds per command
+STOP_TIMEOUT = 2 # seconds to exit after stdin is closed, then the process is killed
+BEGIN_MARK = "<<<LMTK-BEGIN {id}>>>"
+END_MARK = "<<<LMTK-END {id}>>>"
+
+# Protocol: a request is one line of JSON {"id": 1, "script": "..."} on stdin, the answer is a BEGIN line,
+# one line of JSON {"ok": bool, "output": [...], "errors": [...]} and an END line on stdout.
+# "ok" is false when the script threw, non-terminating errors only end up in "errors".
+# Any process speaking this protocol can stand in for PowerShell, see PowerShellHost(command=...)
+HOST_SCRIPT = r'''
+$ProgressPreference = 'SilentlyContinue'
+try { [Console]::OutputEncoding = New-Object System.Text.UTF8Encoding $false } catch { }
+$stdin = [Console]::In
+$stdout = [Console]::Out
+while ($null -ne ($line = $stdin.ReadLine())) {
+  $request = ConvertFrom-Json $line
+  $ok = $true
+  $output = @()
+  $errors = @()
+  try {
+    foreach ($item in @(& ([ScriptBlock]::Create($request.script)) 2>&1)) {
+      if ($item -is [System.Management.Automation.ErrorRecord]) { $errors += $item.ToString() }
+      else { $output += ,$item }
+    }
+  } catch {
+    $ok = $false
+    $errors += $_.ToString()
+  }
+  $response = ConvertTo-Json -InputObject @{ok = $ok; output = $output; errors = $errors} -Depth 4 -Compress
+  $stdout.WriteLine("<<<LMTK-BEGIN $($request.id)>>>")
+  $stdout.WriteLine($response)
+  $stdout.WriteLine("<<<LMTK-END $($request.id)>>>")
+  $stdout.Flush()
+}
+'''
+
+class PowerShellError(Exception):
+  """A command failed, or PowerShell could not be started or died"""
+
+class PowerShellTimeout(PowerShellError):
+  """A command ran longer than its timeout, the process was stopped"""
+
+def default_command():
+  """Windows PowerShell on Windows, pwsh elsewhere, LMTK_POWERSHELL overrides the executable"""
+  executable = os.environ.get("LMTK_POWERSHELL") or ("powershell" if os.name == "nt" else "pwsh")
+  encoded = base64.b64encode(HOST_SCRIPT.encode("utf-16-le")).decode("ascii") # no command line quoting issues
+  return [executable, "-NoProfile", "-NonInteractive", "-ExecutionPolicy", "Bypass", "-EncodedCommand", encoded]
+
+class PowerShellHost():
+  """
+  Starts PowerShell once and sends it commands one at a time; a command that times out kills the process
+  and a dead process is started again by the next command
+  """
+  def __init__(self, command=None, timeout=DEFAULT_TIMEOUT):
+    self.command = command or default_command()
+    self.timeout = timeout
+    self.process = None
+    self.starts = 0 # processes started so far
+    self._lines = None
+    self._stderr = collections.deque(maxlen=20) # last lines, for error messages
+    self._ids = itertools.count(1)
+    self._lock = threading.Lock()
+
+  def start(self):
+    """Start the process and the threads reading its output"""
+    try:
+      self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="replace", bufsize=1)
+    except OSError as e:
+      raise PowerShellError(f"{self.command[0]}: {e}") from e
+    self.starts += 1
+    self._lines = queue.Queue()
+    threading.Thread(target=self._read, args=(self.process.stdout, self._lines), daemon=True).start()
+    threading.Thread(target=self._drain, args=(self.process.stderr,), daemon=True).start()
+
+  def _read(self, stream, lines):
+    """Reader thread: queue stdout lines, None when the process exits"""
+    for line in stream:
+      lines.put(line.rstrip("\r\n"))
+    lines.put(None)
+
+  def _drain(self, stream):
+    """Reader thread: keep the last stderr lines, so the pipe never fills up"""
+    for line in stream:
+      self._stderr.append(line.rstrip("\r\n"))
+
+  def stop(self, kill=False):
+    """Let the process exit, kill it if it doesn't or when asked to; the next command starts a new one"""
+    process, self.process = self.process, None
+    if process is None:
+      return
+    try:
+      if kill: # busy with a command, it won't read stdin
+        raise subprocess.TimeoutExpired(self.command, 0)
+      process.stdin.close()
+      process.wait(STOP_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+      process.kill()
+      process.wait()
+
+  def run(self, script, timeout=None):
+    """Run a script and return its output objects, raise PowerShellError if it threw"""
+    result = self.call(script, timeout)
+    if not result["ok"]:
+      raise PowerShellError("; ".join(result["errors"]))
+    return result["output"]
+
+  def call(self, script, timeout=None):
+    """Run a script and return {"ok", "output", "errors"}"""
+    with self._lock:
+      request_id = next(self._ids)
+      request = json.dumps({"id": request_id, "script": script}) + "\n" # ASCII only, whatever the console encoding
+      for attempt in range(2):
+        if self.process is None or self.process.poll() is not None:
+          self.stop()
+          self.start()
+        try:
+          self.process.stdin.write(request)
+          self.process.stdin.flush()
+          break
+        except OSError as e: # died before reading the command, it's safe to send it again
+          self.stop()
+          if attempt:
+            raise PowerShellError(f"{self.command[0]}: {e}") from e
+      return self._response(request_id, self.timeout if timeout is None else timeout)
+
+  def _response(self, request_id, timeout):
+    """Wait for the delimited answer to a request"""
+    begin = BEGIN_MARK.format(id=request_id)
+    end = END_MARK.format(id=request_id)
+    lines = self._lines
+    body = None # lines before the BEGIN mark are stray output
+    deadline = time.monotonic() + timeout
+    try:
+      while True:
+        line = lines.get(timeout=max(0, deadline - time.monotonic()))
+        if line is None:
+          self.stop()
+          raise PowerShellError(f"{self.command[0]} exited: " + " ".join(self._stderr))
+        if line == begin:
+          body = []
+        elif line == end and body is not None:
+          return json.loads("".join(body))
+        elif body is not None:
+          body.append(line)
+    except queue.Empty:
+      self.stop(kill=True)
+      raise PowerShellTimeout(f"{self.command[0]}: no answer in {timeout} s") from None
+
+_host = None
+_host_lock = threading.Lock()
+
+def get_host():
+  """The host shared by the whole app, started by its first command and stopped at exit"""
+  global _host # pylint: disable=global-statement
+  with _host_lock:
+    if _host is None:
+      _host = PowerShellHost()
+      atexit.register(_host.stop)
+    return _host
+
+def run(script, timeout=None):
+  """Run a script on the shared host, see PowerShellHost.run"""
+  return get_host().run(script, timeout)
+
+def call(script, timeout=None):
+  """Run a script on the shared host, see PowerShellHost.call"""
+  return get_host().call(script, timeout)
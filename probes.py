@@ -0,0 +1,148 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: probes.py
+Description: Where the report gets its raw data: Windows itself, Windows with a recording, or a recorded fixture
+'''
+
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+import powershell
+from change_tokens import section_token
+
+# Fixture: {"powershell": {probe name: {"ok", "output", "errors"}}, "wmi": {device class: WMI result}}
+# WMI result: {"rows": [{property: value}], "seconds": float, "complete": bool, "error": str or None},
+# "complete" is False when the query failed ("error") or ran past its timeout, "rows" are then empty
+
+# One hardware section: the only properties the report shows, an optional WQL condition and seconds to wait
+WmiQuery = namedtuple("WmiQuery", ["device_class", "wmi_class", "properties", "where", "timeout"])
+
+def wql(query):
+  """SELECT of only the properties a query needs"""
+  text = f"SELECT {', '.join(query.properties)} FROM {query.wmi_class}"
+  return f"{text} WHERE {query.where}" if query.where else text
+
+def run_wmi_query(connection, query, results):
+  """Query thread: store the rows and time of one query, a single assignment when it's done"""
+  import pythoncom # pylint: disable=import-outside-toplevel
+  import wmi # pylint: disable=import-outside-toplevel
+  pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
+  started = time.perf_counter()
+  try:
+    rows = [{name: getattr(item, name) for name in query.properties} for item in connection.query(wql(query))]
+    results[query.device_class] = {"rows": rows, "seconds": time.perf_counter() - started, "complete": True,
+      "error": None}
+  except (wmi.x_wmi, pythoncom.com_error) as e:
+    results[query.device_class] = {"rows": [], "seconds": time.perf_counter() - started, "complete": False,
+      "error": str(e)}
+  finally:
+    pythoncom.CoUninitialize()
+
+class ProbeError(Exception):
+  """WMI can't be reached, or a fixture can't be read or has no output for a probe"""
+
+class WindowsProbe():
+  """PowerShell, WMI and the registry of this machine"""
+  def powershell(self, _name, script, timeout=None):
+    """Result of a PowerShell script, see powershell.call"""
+    return powershell.call(script, timeout)
+
+  def wmi(self, queries):
+    """
+    Run the queries side by side on one connection and return their results by device class;
+    a query still running at its timeout is left behind in the background and comes back incomplete
+    """
+    import pythoncom # pylint: disable=import-outside-toplevel
+    import wmi # pylint: disable=import-outside-toplevel
+    pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED) # the query threads share the connection
+    try:
+      try:
+        connection = wmi.WMI()
+      except (wmi.x_wmi, pythoncom.com_error) as e:
+        raise ProbeError(f"WMI: {e}") from e
+      results = {}
+      started = time.monotonic()
+      threads = []
+      for query in queries:
+        thread = threading.Thread(target=run_wmi_query, args=(connection, query, results), daemon=True,
+          name=f"wmi-{query.device_class}") # daemon: a hung query doesn't keep the app from exiting
+        thread.start()
+        threads.append((query, thread))
+      for query, thread in threads:
+        thread.join(max(0, started + query.timeout - time.monotonic()))
+      return {query.device_class: results.get(query.device_class) or
+        {"rows": [], "seconds": query.timeout, "complete": False, "error": None} for query in queries}
+    finally:
+      pythoncom.CoUninitialize()
+
+  def token(self, section):
+    """Change token of an inventory section, see change_tokens"""
+    return section_token(section)
+
+class RecordingProbe():
+  """Passes everything to another probe and writes the raw outputs to a fixture file"""
+  def __init__(self, path, probe=None):
+    self.path = path
+    self.probe = probe or WindowsProbe()
+    self.fixture = {"powershell": {}, "wmi": {}}
+    self._lock = threading.Lock() # collectors run on several threads
+
+  def powershell(self, name, script, timeout=None):
+    """Run and record a PowerShell probe"""
+    result = self.probe.powershell(name, script, timeout)
+    self.record("powershell", {name: result})
+    return result
+
+  def wmi(self, queries):
+    """Run and record WMI queries"""
+    results = self.probe.wmi(queries)
+    self.record("wmi", results)
+    return results
+
+  def token(self, _section):
+    """No token, so a warm cache cannot serve a section and leave it out of the fixture"""
+    return None
+
+  def record(self, kind, outputs):
+    """Add outputs to the fixture and write it atomically"""
+    with self._lock:
+      self.fixture[kind].update(outputs)
+      tmp_path = self.path + ".tmp"
+      with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(self.fixture, f, ensure_ascii=False, indent=1, default=str) # COM dates and the like as text
+      os.replace(tmp_path, self.path)
+
+class ReplayProbe():
+  """Serves the outputs of a fixture, on any platform"""
+  def __init__(self, path=None, fixture=None):
+    if fixture is None:
+      try:
+        with open(path, "r", encoding="utf-8") as f:
+          fixture = json.load(f)
+      except (OSError, ValueError) as e:
+        raise ProbeError(f"{path}: {e}") from e
+    self.fixture = fixture
+
+  def powershell(self, name, _script, _timeout=None):
+    """Recorded result of a PowerShell probe"""
+    try:
+      return self.fixture["powershell"][name]
+    except KeyError:
+      raise ProbeError(f"No recorded PowerShell output for {name}") from None
+
+  def wmi(self, queries):
+    """Recorded results of WMI queries"""
+    try:
+      return {query.device_class: self.fixture["wmi"][query.device_class] for query in queries}
+    except KeyError as e:
+      raise ProbeError(f"No recorded WMI output for {e}") from None
+
+  def token(self, _section):
+    """No tokens, replays neither use nor fill the cache"""
+    return None
@@ -0,0 +1,72 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: progress.py
+Description: Byte-accurate backup progress: counting reader, throughput and ETA, rate-limited reports
+'''
+
+import time
+
+class ProgressTracker():
+  """Counts processed bytes and calls back with a progress snapshot at most once per interval"""
+  def __init__(self, total, callback=None, interval=0.5):
+    self.total = total
+    self.callback = callback
+    self.interval = interval
+    self.done = 0
+    self.current_file = ""
+    self.rate = 0.0 # bytes per second, smoothed
+    self.started = time.monotonic()
+    self._last_report = self.started
+    self._last_done = 0
+
+  def set_file(self, path):
+    """Remember the file being read"""
+    self.current_file = path
+
+  def add(self, count):
+    """Count read bytes, only every interval seconds does this do more than an addition"""
+    self.done += count
+    now = time.monotonic()
+    if now - self._last_report >= self.interval:
+      self.report(now)
+
+  def report(self, now=None):
+    """Update the throughput and hand a snapshot to the callback"""
+    now = now or time.monotonic()
+    elapsed = now - self._last_report
+    if elapsed > 0:
+      current = (self.done - self._last_done) / elapsed
+      self.rate = current if self.rate == 0 else 0.7 * self.rate + 0.3 * current
+    self._last_report = now
+    self._last_done = self.done
+    if self.callback:
+      self.callback(self.snapshot())
+
+  def snapshot(self):
+    """Bytes done and total, current file, bytes per second and seconds left (None while unknown)"""
+    remaining = max(0, self.total - self.done)
+    return {
+      "done": self.done,
+      "total": self.total,
+      "fraction": min(1.0, self.done / self.total) if self.total else 1.0,
+      "current_file": self.current_file,
+      "rate": self.rate,
+      "eta": remaining / self.rate if self.rate > 0 else None,
+      "elapsed": time.monotonic() - self.started,
+    }
+
+class CountingReader():
+  """Read-only file wrapper that reports every read to a ProgressTracker"""
+  def __init__(self, fileobj, progress):
+    self.fileobj = fileobj
+    self.progress = progress
+
+  def read(self, size=-1):
+    """Read and count"""
+    data = self.fileobj.read(size)
+    self.progress.add(len(data))
+    return data
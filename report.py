@@ -5,278 +5,222 @@
 
 '''
 Module: report.py
-Description: Generates report in Markdown and HTML about software installed and hardware
+Description: Generates report in Markdown, HTML and JSON about software installed and hardware
 '''
 
-import os # remove old files
-import subprocess # execute PowerShell scripts for hardware detection
-from datetime import datetime # timestamp in report
-import re # edit text files, generated by PowerShell
+import os # report folder
+import shutil # free space of cached drives
+import re # clean app names
 import webbrowser # open links in standard browser
-import pythoncom # for hardware detection
-import markdown # convert report from markdown to html
-import wmi # hardware detection in Windows
+from typing import TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor, as_completed # collectors run at the same time
 from i18n import _
-from app_context import AppContext # filenames and other variables
 from report_defaults import ReportDefaults
+from inventory import App, Device, Inventory, SOURCE_STANDARD, SOURCE_STORE
+from report_render import render_markdown, write_html, render_json
+from inventory_cache import InventoryCache
+from probes import WindowsProbe, WmiQuery, ProbeError
+from powershell import PowerShellError
+if TYPE_CHECKING:
+  from app_context import AppContext # the UI context, the command line runs without tkinter
+
+COLLECTOR_WORKERS = 2 # collectors waiting for PowerShell at once, the shared process runs one command at a time
+APPS_TIMEOUT = 120 # seconds, listing apps on a slow disk takes a while
+WMI_TIMEOUT = 10 # seconds for a hardware section, a slower one is left incomplete
+WMI_SLOW_TIMEOUT = 20 # seconds for queries that filter many objects
+GUID_PATTERN = re.compile(r"^[0-9a-fA-F\-]{36}$") # nameless store packages
+STORE_PREFIXES = ["MicrosoftWindows.", "Microsoft.Windows.", "Microsoft.", "MicrosoftCorporationII."]
+
+def publisher_name(publisher):
+  """Readable publisher, store packages have a certificate subject like CN=Name, O=..."""
+  publisher = str(publisher or "").strip()
+  if publisher.startswith("CN="):
+    publisher = publisher[3:].split(",")[0].strip('" ')
+  return publisher or None
+
+# Hardware sections in report order, every query reads only the properties the report shows
+HARDWARE_QUERIES = [
+  WmiQuery("cpu", "Win32_Processor", ["Name", "NumberOfCores"], "", WMI_TIMEOUT),
+  WmiQuery("ram", "Win32_ComputerSystem", ["TotalPhysicalMemory"], "", WMI_TIMEOUT),
+  WmiQuery("drive", "Win32_LogicalDisk", ["DeviceID", "Size", "FreeSpace"], "DriveType=3", WMI_TIMEOUT),
+  WmiQuery("gpu", "Win32_VideoController", ["Name"], "", WMI_TIMEOUT),
+  WmiQuery("network", "Win32_NetworkAdapter", ["Name", "NetConnectionID", "AdapterType"],
+    "PhysicalAdapter=True AND NetEnabled=True", WMI_TIMEOUT),
+  WmiQuery("printer", "Win32_Printer", ["Name", "PortName"], "", WMI_TIMEOUT), # network printers answer slowly
+  WmiQuery("scanner", "Win32_PnPEntity", ["Name"], "Name LIKE '%scanner%' OR Name LIKE '%imaging%'",
+    WMI_SLOW_TIMEOUT), # goes through every PnP device
+]
+
+def device_from_row(device_class, row):
+  """Device record of a WMI row, WMI gives 64-bit numbers as strings"""
+  name = str(row.get("Name") or "").strip()
+  if device_class == "cpu":
+    return Device(device_class, name, {"cores": row["NumberOfCores"]})
+  if device_class == "ram":
+    return Device(device_class, "", {"size": int(row["TotalPhysicalMemory"])})
+  if device_class == "drive":
+    return Device(device_class, row["DeviceID"], {"size": int(row["Size"] or 0), "free": int(row["FreeSpace"] or 0)})
+  if device_class == "network":
+    return Device(device_class, name, {"connection_id": row["NetConnectionID"], "type": row["AdapterType"]})
+  if device_class == "printer":
+    return Device(device_class, name, {"port": row["PortName"]})
+  return Device(device_class, name, {})
+
+def refresh_drive(device):
+  """A cached drive with its current size and free space, which change without changing the devices token"""
+  if device.device_class != "drive":
+    return device
+  try:
+    usage = shutil.disk_usage(device.name + os.sep)
+  except OSError:
+    return device
+  return device._replace(details={**device.details, "size": usage.total, "free": usage.free})
 
 class Report():
   """Functions to generate html and Markdown report"""
-  def __init__(self):
-    self.report_defaults = ReportDefaults()
-
-  def markdown_to_html(self):
-    """Convert Markdown files to a single html report"""
-    # Read markdown content
-    with open(self.report_defaults.md_report, "r", encoding="utf-8") as f:
-      text = f.read()
-
-    # Convert to HTML
-    html = markdown.markdown(text, extensions=["fenced_code", "tables", "toc", "attr_list"])
-
-    # Wrap in basic HTML boilerplate
-    full_html = f"""<!DOCTYPE html>
-<html>
-<head>
-  <meta charset="utf-8">
-  <title>{_('Linux Migration Toolkit Report')}</title>
-  <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/@picocss/pico@2/css/pico.min.css">
-</head>
-<body>
-<main class="container">
-{html}
-</main>
-</body>
-</html>
-"""
-
-    # Write HTML file
-    with open(self.report_defaults.html_report, "w", encoding="utf-8") as f:
-      f.write(full_html)
-
-  def get_hwsw_report(self):
-    """Generate Markdown report about hardware and software registered"""
-    from i18n import _
-    file1 = self.report_defaults.standard_apps_md
-    file2 = self.report_defaults.store_apps_md
-    file3 = self.report_defaults.hw_report_md
-    output_file = self.report_defaults.md_report
-    # Titles
-    main_title = f"# {_('Linux Migration Toolkit Report')}"
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    sections = [
-      (f"## {_('Standard Applications')}", file1),
-      (f"## {_('Microsoft Store Applications')}", file2),
-      (f"## {_('Hardware Information')}", file3),
-  ]
-
-    # Combine files into one markdown report
-    with open(output_file, "w", encoding="utf-8") as out:
-      out.write(f"""
-{main_title}
-
-*{_('Generated on')} {timestamp}*
-
-## {_('What do I do with this information?')}
-
-{_('You can use this report to')}:
-
-- {_('Check your hardware\'s compatibility with Linux')}.
-- {_('Find Linux alternatives for the Windows programs you currently use')}.
-
-{_('Helpful resources')}:
-
-- [Ubuntu Hardware Support Wiki](https://wiki.ubuntu.com/HardwareSupport)
-- [{_('Linux software equivalents to Windows software')}](https://wiki.linuxquestions.org/wiki/Linux_software_equivalent_to_Windows_software)\n\n
-
-## {_('Table of Contents')}
-
-- [{_('Standard Applications')}](#standard-applications) &dash; {_('these apps are installed, when you download and installation file and launch it')}
-- [{_('Microsoft Store Applications')}](#microsoft-store-applications) &dash; {_('these are the apps, installed from Microsoft Store')}
-- [{_('Hardware Information')}](#hardware-information) &dash; {_('some basic information about your system')}: CPU, GPU, RAM, HDD/SSD\n
-""")
-
-      for header, filename in sections:
-        out.write(f"{header}\n\n")
-        with open(filename, "r", encoding="utf-8") as f:
-          out.write(f.read().strip() + "\n\n")
-
-    # Remove original files
-    for _, filename in sections:
-      try:
-        os.remove(filename)
-      except OSError as e:
-        print(f"{_('Error deleting')} {filename}: {e}")
-
-  def get_hw_info(self):
-    """Generate Markdown report about available hardware"""
-    filename = self.report_defaults.hw_report_md
-    pythoncom.CoInitialize()
-    try:
-      c = wmi.WMI()
-      lines = []
-
-      def add_section(title, items):
-        lines.append(f"\n### {title}:\n")
-        lines.extend(items)
-
-      # CPU info
-      cpus = c.Win32_Processor()
-      add_section("CPU", [
-        f"- {_('Name')}: {cpu.Name}\n- {_('Number of Cores')}: {cpu.NumberOfCores}"
-        for cpu in cpus
-      ])
-
-      # RAM info
-      system_info = c.Win32_ComputerSystem()[0]
-      total_ram_gb = int(system_info.TotalPhysicalMemory) / (1024 ** 3)
-      add_section("RAM", [f"- {total_ram_gb:.2f} GB"])
-
-      # Drives
-      drives = c.Win32_LogicalDisk(DriveType=3)
-      add_section(_("Drives"), [
-        f"- {d.DeviceID} - {_('Size')}: {int(d.Size)/(1024**3):.2f} GB, {_('Free')}: {int(d.FreeSpace)/(1024**3):.2f} GB"
-        for d in drives
-      ])
-
-      # GPU
-      gpus = c.Win32_VideoController()
-      add_section("GPU", [f"- {g.Name}" for g in gpus])
-
-      # Network adapters (filtered in WMI)
-      net_adapters = c.query(
-        "SELECT * FROM Win32_NetworkAdapter WHERE PhysicalAdapter=True AND NetEnabled=True"
-      )
-      add_section(_("Network Adapters"), [
-        f"- {_('Name')}: {n.Name}, {_('Connection ID')}: {n.NetConnectionID}, {_('Type')}: {n.AdapterType}"
-        for n in net_adapters
-      ])
-
-      # Printers
-      printers = c.Win32_Printer()
-      add_section(_("Printers"), [
-        f"- {_('Name')}: {p.Name}, {_('Port')}: {p.PortName}"
-        for p in printers
-      ])
-
-      # Scanners (filtered in WMI)
-      scanners = c.query(
-        "SELECT * FROM Win32_PnPEntity WHERE Name LIKE '%scanner%' OR Name LIKE '%imaging%'"
-      )
-      if scanners:
-        add_section(_("Scanners"), [f"- {_('Name')}: {s.Name}" for s in scanners])
-      else:
-        add_section(_("Scanners"), [f"- {_('No devices found')}"])
-    finally:
-      pythoncom.CoUninitialize()
-
-    # Write all lines to file
-    with open(filename, "w", encoding="utf-8") as f:
-      f.write("\n".join(lines))
-
-    # Generate combined report and remove partial reports
-    self.get_hwsw_report()
-
-    # generate html report
-    self.markdown_to_html()
-
-  def clean_apps(self, is_standard_list):
-    """Clean a list of apps created by PowerShell"""
-    # Input and output file paths
-    if is_standard_list:
-      input_file = self.report_defaults.standard_apps_txt
-      output_file = self.report_defaults.standard_apps_md
-    else:
-      input_file = self.report_defaults.store_apps_txt
-      output_file = self.report_defaults.store_apps_md
-      guid_pattern = re.compile(r"^[0-9a-fA-F\-]{36}$")
-      prefixes = [
-        "MicrosoftWindows.",
-        "Microsoft.Windows.",
-        "Microsoft.",
-        "MicrosoftCorporationII."
-      ]
-
-    cleaned_names = set()
-
-    with open(input_file, "r", encoding="utf-8") as f:
-      lines = f.readlines()[3:]  # Skip headers
-
-      for line in lines:
-        line = line.strip()
-        if not line:
+  def __init__(self, report_dir=None, use_cache=True, cache_dir=None, probe=None):
+    self.report_defaults = ReportDefaults(report_dir)
+    self.probe = probe or WindowsProbe() # or a recording, or a replay of one, see probes
+    self.use_cache = use_cache # False collects everything again, the cache is still updated
+    self.cache = InventoryCache(cache_dir)
+
+  def get_hw_info(self, inventory=None):
+    """Devices found by WMI, the inventory gets the time of every query and the sections left incomplete"""
+    results = self.probe.wmi(HARDWARE_QUERIES)
+    devices = []
+    for query in HARDWARE_QUERIES:
+      result = results[query.device_class]
+      devices.extend(device_from_row(query.device_class, row) for row in result["rows"])
+      if inventory is not None:
+        inventory.timings[query.device_class] = result["seconds"]
+        if not result["complete"]:
+          inventory.partial[query.device_class] = result.get("error")
+    return devices
+
+  def clean_apps(self, items, source):
+    """Apps from PowerShell objects, without drivers, system packages and duplicates, sorted by name"""
+    apps = {}
+    for item in items:
+      item = item or {}
+      name = str(item.get("Name") or "").strip()
+      if not name:
+        continue
+      if source == SOURCE_STORE:
+        if GUID_PATTERN.match(name):
           continue
-
-        if not is_standard_list:
-          if guid_pattern.match(line):
-            continue
-          for prefix in prefixes:
-            if line.startswith(prefix):
-              line = line[len(prefix):]
-              break
-        else:
-          if "driver" in line.lower():
-            continue
-
-        line = "- " + line
-        cleaned_names.add(line)
-
-    with open(output_file, "w", encoding="utf-8") as f:
-      for name in sorted(cleaned_names):
-        f.write(name + "\n")
-
-    try:
-      os.remove(input_file)
-    except OSError as e:
-      print(f"{_('Error deleting')} {input_file}: {e}")
-
-  def get_info_thread(self, context: AppContext):
-    """Launch PowerShell scripts and create Markdown and html reports"""
-    # PowerShell command
-    command_storeapps = 'Get-AppxPackage | Select-Object Name'
-
-    # Run the command
-    result = subprocess.run(
-      ["powershell", "-Command", command_storeapps],
-      capture_output=True,
-      text=True,
-      check=False
-    )
-    with open(self.report_defaults.store_apps_txt, "w", encoding="utf-8") as f:
-      f.write(result.stdout)
-    if result.stderr:
-      print("PowerShell error:\n", result.stderr)
-    self.clean_apps(False) # remove dups, empty lines, etc.
-
+        for prefix in STORE_PREFIXES:
+          if name.startswith(prefix):
+            name = name[len(prefix):]
+            break
+      elif "driver" in name.lower():
+        continue
+      size = item.get("Size")
+      apps.setdefault(name, App(name, publisher_name(item.get("Publisher")), item.get("Version") or None,
+        int(size) * 1024 if size else None, source)) # the registry keeps kilobytes
+    return [apps[name] for name in sorted(apps)]
+
+  def list_apps(self, name, command):
+    """Objects a PowerShell command outputs, its errors are printed"""
+    result = self.probe.powershell(name, command, APPS_TIMEOUT)
+    if result["errors"]:
+      print("PowerShell error:\n", "\n".join(result["errors"]))
+    return result["output"]
+
+  def get_store_apps(self):
+    """Microsoft Store apps"""
+    command_storeapps = "Get-AppxPackage | Select-Object Name, Publisher, Version"
+    return self.clean_apps(self.list_apps("store_apps", command_storeapps), SOURCE_STORE)
+
+  def get_standard_apps(self):
+    """Apps registered for uninstall"""
     command_standardapps = """
 Get-ItemProperty HKLM:\\Software\\Wow6432Node\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\*,
                   HKLM:\\Software\\Microsoft\\Windows\\CurrentVersion\\Uninstall\\* |
-    Select-Object DisplayName |
     Where-Object { $_.DisplayName } |
-    Sort-Object DisplayName
+    Select-Object @{n='Name'; e={$_.DisplayName}}, Publisher, @{n='Version'; e={$_.DisplayVersion}},
+                  @{n='Size'; e={$_.EstimatedSize}}
 """
-    result = subprocess.run(
-      ["powershell", "-Command", command_standardapps],
-      capture_output=True,
-      text=True,
-      check=False
-    )
-    with open(self.report_defaults.standard_apps_txt, "w", encoding="utf-8") as f:
-      f.write(result.stdout)
-    if result.stderr:
-      print("PowerShell error:\n", result.stderr)
-
-    self.clean_apps(True) # remove dups, empty lines, etc.
-    self.get_hw_info() # get hardware info in markdown format
+    return self.clean_apps(self.list_apps("standard_apps", command_standardapps), SOURCE_STANDARD)
+
+  def generate(self, on_status=None):
+    """
+    Collect the sections whose change token moved since the last report, at the same time, take the rest
+    from the cache, render the inventory as Markdown, html and JSON reports and return their paths
+    """
+    inventory = Inventory()
+    cache = self.cache.load()
+    collectors = [
+      ("store_apps", self.get_store_apps, _("Microsoft Store applications listed")),
+      ("standard_apps", self.get_standard_apps, _("Standard applications listed")),
+      ("devices", lambda: self.get_hw_info(inventory), _("Hardware information gathered")),
+    ]
+    tokens = {}
+    changed = []
+    for section, collect, text in collectors:
+      tokens[section] = self.probe.token(section) # before collecting, a change meanwhile shows up next time
+      records = cache.get(section, tokens[section]) if self.use_cache else None
+      if records is None:
+        changed.append((section, collect, text))
+        continue
+      setattr(inventory, section, records)
+      if on_status is not None:
+        on_status(text)
+    inventory.devices = [refresh_drive(device) for device in inventory.devices]
+
+    # WMI gets a thread of its own, the Windows probe initializes COM on it
+    with ThreadPoolExecutor(max_workers=COLLECTOR_WORKERS, thread_name_prefix="report") as pool, \
+        ThreadPoolExecutor(max_workers=1, thread_name_prefix="wmi") as wmi_pool:
+      futures = {(wmi_pool if section == "devices" else pool).submit(collect): (section, text)
+        for section, collect, text in changed}
+      for future in as_completed(futures):
+        section, text = futures[future]
+        records = future.result() # the first failure stops the report
+        setattr(inventory, section, records)
+        if section != "devices" or not inventory.partial: # incomplete hardware is queried again next time
+          cache.put(section, tokens[section], records)
+        if on_status is not None:
+          on_status(text)
+    if changed:
+      try:
+        cache.save()
+      except OSError as e: # the cache only saves time
+        print(f"{_('Error saving')} {cache.path}: {e}")
+    return self.write_reports(inventory)
+
+  def write_reports(self, inventory):
+    """Render the inventory into the report folder, return the Markdown, html and JSON paths"""
+    os.makedirs(self.report_defaults.report_dir, exist_ok=True)
+    write_html(inventory, self.report_defaults.html_report) # straight from the records, Markdown is an export
+    for path, text in [
+      (self.report_defaults.md_report, render_markdown(inventory)),
+      (self.report_defaults.json_report, render_json(inventory)),
+    ]:
+      with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return tuple(os.path.abspath(path) for path in
+      [self.report_defaults.md_report, self.report_defaults.html_report, self.report_defaults.json_report])
+
+  def get_info_thread(self, context: "AppContext"):
+    """Generate the reports, then update the UI"""
+    try:
+      self.generate()
+    except (OSError, ImportError, PowerShellError, ProbeError) as e: # pythoncom and wmi exist only on Windows
+      context.root.after(0, lambda e=e: self.fail_get_info(context, e))
+      return
     context.root.after(0, lambda: self.finish_get_info(context)) # called after the thread finishes
 
-  def finish_get_info(self, context: AppContext):
+  def finish_get_info(self, context: "AppContext"):
     """Stop progress bar and inform user when report is ready"""
     context.stop_progress()
     context.set_report_label(_("Finished gathering software and hardware info"))
     context.view_btn.config(state="normal")
     context.report_generated = True
 
+  def fail_get_info(self, context: "AppContext", error):
+    """Stop progress bar and show why there is no report, coming back to this step tries again"""
+    context.stop_progress()
+    context.set_report_label(_("Could not gather software and hardware info: ") + str(error))
+
   def open_report(self):
     """Open software and hardware html report in default browser"""
     webbrowser.open_new(f"file://{os.path.abspath(self.report_defaults.html_report)}")
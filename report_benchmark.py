@@ -0,0 +1,128 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: report_benchmark.py
+Description: Times the report pipeline on a synthetic or recorded fixture, on any OS:
+python report_benchmark.py --apps 10000 --devices 300
+'''
+
+import os
+import sys
+import json
+import random
+import tempfile
+import argparse
+import statistics
+import time
+from report import Report, HARDWARE_QUERIES
+from report_render import render_markdown, write_html, render_json
+from inventory import Inventory, SOURCE_STANDARD, SOURCE_STORE
+from probes import ReplayProbe
+
+PUBLISHERS = ["Microsoft Corporation", "Adobe Inc.", "Google LLC", "Mozilla", "Igor Pavlov", "Valve", "NVIDIA Corporation",
+  "Intel Corporation", "Realtek Semiconductor Corp.", "The Document Foundation", "Oracle Corporation", "JetBrains s.r.o."]
+WORDS = ["Studio", "Player", "Runtime", "Tools", "Update", "Helper", "SDK", "Viewer", "Editor", "Suite", "Client"] # no drivers
+
+def synthetic_fixture(apps=10000, devices=300, seed=1):
+  """
+  A replay fixture that cleans to this many standard apps, a quarter as many store apps and devices, like a busy machine;
+  the duplicates and nameless packages clean_apps drops come on top
+  """
+  rng = random.Random(seed)
+  standard = []
+  for i in range(apps):
+    standard.append({"Name": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}", "Publisher": rng.choice(PUBLISHERS),
+      "Version": f"{rng.randint(1, 30)}.{i}", "Size": rng.choice([None, rng.randint(100, 5_000_000)])})
+    if i % 10 == 0:
+      standard.append(dict(standard[-1])) # the 32- and 64-bit keys list some apps twice
+  store = []
+  for i in range(apps // 4):
+    name = f"{rng.choice(['Microsoft.', 'MicrosoftWindows.', 'Vendor'])}{rng.choice(WORDS)}{i}"
+    store.append({"Name": name, "Publisher": f"CN={rng.choice(PUBLISHERS)}, O=Example, C=US", "Version": f"1.0.{i}.0"})
+    if i % 20 == 0:
+      store.append({"Name": f"{rng.getrandbits(32):08x}-0000-0000-0000-{i:012x}", "Publisher": "", # nameless packages
+        "Version": "1.0.0.0"})
+
+  device_classes = [query.device_class for query in HARDWARE_QUERIES if query.device_class != "ram"]
+  wmi = {query.device_class: {"rows": [], "seconds": 0.0, "complete": True, "error": None} for query in HARDWARE_QUERIES}
+  wmi["ram"]["rows"].append({"TotalPhysicalMemory": str(64 * 1024 ** 3)})
+  for i in range(devices):
+    device_class = device_classes[i % len(device_classes)]
+    name = f"{device_class.upper()} device {i}"
+    wmi[device_class]["rows"].append({
+      "Name": name, "NumberOfCores": 8, "DeviceID": f"{chr(67 + i % 24)}:", "Size": str(2 ** 40),
+      "FreeSpace": str(2 ** 39), "NetConnectionID": f"Ethernet {i}", "AdapterType": "Ethernet 802.3", "PortName": f"USB{i:03}",
+    })
+  return {
+    "powershell": {
+      "standard_apps": {"ok": True, "output": standard, "errors": []},
+      "store_apps": {"ok": True, "output": store, "errors": []},
+    },
+    "wmi": wmi,
+  }
+
+def timed(function, repeat):
+  """Best and median seconds of a few calls"""
+  times = []
+  for _ in range(repeat):
+    started = time.perf_counter()
+    function()
+    times.append(time.perf_counter() - started)
+  return min(times), statistics.median(times)
+
+def main(argv=None):
+  """Print how long every step of the report takes"""
+  parser = argparse.ArgumentParser(description="time the report pipeline on a synthetic or recorded fixture")
+  parser.add_argument("--apps", type=int, default=10000, help="standard apps in the synthetic fixture")
+  parser.add_argument("--devices", type=int, default=300, help="devices in the synthetic fixture")
+  parser.add_argument("--fixture", help="a fixture recorded with lmtk report --record instead")
+  parser.add_argument("--save", help="write the synthetic fixture here")
+  parser.add_argument("--repeat", type=int, default=5)
+  parser.add_argument("--json", action="store_true", help="results as JSON")
+  args = parser.parse_args(argv)
+
+  probe = ReplayProbe(args.fixture) if args.fixture else ReplayProbe(fixture=synthetic_fixture(args.apps, args.devices))
+  if args.save:
+    with open(args.save, "w", encoding="utf-8") as f:
+      json.dump(probe.fixture, f)
+
+  with tempfile.TemporaryDirectory() as folder:
+    report = Report(folder, use_cache=False, cache_dir=folder, probe=probe)
+    standard_items = probe.powershell("standard_apps", None)["output"]
+    store_items = probe.powershell("store_apps", None)["output"]
+    inventory = Inventory()
+    inventory.standard_apps = report.clean_apps(standard_items, SOURCE_STANDARD)
+    inventory.store_apps = report.clean_apps(store_items, SOURCE_STORE)
+    inventory.devices = report.get_hw_info()
+    if not args.fixture:
+      assert (len(inventory.standard_apps), len(inventory.store_apps)) == (args.apps, args.apps // 4), \
+        "the synthetic fixture must clean to the requested number of apps"
+    html_path = os.path.join(folder, "benchmark.html")
+
+    steps = [
+      ("clean_apps standard", lambda: report.clean_apps(standard_items, SOURCE_STANDARD)),
+      ("clean_apps store", lambda: report.clean_apps(store_items, SOURCE_STORE)),
+      ("hardware records", report.get_hw_info),
+      ("render_markdown", lambda: render_markdown(inventory)),
+      ("write_html", lambda: write_html(inventory, html_path)),
+      ("render_json", lambda: render_json(inventory)),
+      ("generate", report.generate),
+    ]
+    results = {name: timed(function, args.repeat) for name, function in steps}
+
+  if args.json:
+    json.dump({"apps": len(inventory.standard_apps), "store_apps": len(inventory.store_apps),
+      "devices": len(inventory.devices), "seconds": {name: {"best": best, "median": median}
+      for name, (best, median) in results.items()}}, sys.stdout, indent=2)
+    print()
+    return 0
+  print(f"{len(inventory.standard_apps)} apps, {len(inventory.store_apps)} store apps, {len(inventory.devices)} devices")
+  for name, (best, median) in results.items():
+    print(f"{name:<22}{best * 1000:10.1f} ms best{median * 1000:10.1f} ms median")
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
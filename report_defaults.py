@@ -5,21 +5,26 @@
 
 '''
 Module: report_defaults.py
-Description: Stores default report filenames
+Description: Stores default report folder and filenames
 '''
 
+import os
+
+def default_report_dir():
+  """LMTK in the user's Documents, a backup of Documents takes the report along"""
+  home = os.path.expanduser("~")
+  documents = os.path.join(home, "Documents")
+  return os.path.join(documents if os.path.isdir(documents) else home, "LMTK")
+
 class ReportDefaults():
-  """A class to store default report filenames"""
-  def __init__(self):
-    """Initialize default values"""
+  """A class to store default report folder and filenames"""
+  def __init__(self, report_dir=None):
+    """Initialize default values, the working directory is often read-only in the packaged app"""
+    self.report_dir = report_dir or default_report_dir()
     self._report_files = {
-      "standard_apps_txt": "installed_standard_apps.txt",
-      "standard_apps_md": "cleaned_standard_apps.md",
-      "store_apps_txt": "installed_store_apps.txt",
-      "store_apps_md": "cleaned_store_apps.md",
-      "hw_report_md": "hardware_info.md",
       "md_report": "swhw_report.md",
       "html_report": "swhw_report.html",
+      "json_report": "swhw_report.json",
     }
     for key in self._report_files:
-      setattr(self.__class__, key, property(lambda self, k=key: self._report_files[k]))
+      setattr(self.__class__, key, property(lambda self, k=key: os.path.join(self.report_dir, self._report_files[k])))
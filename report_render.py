@@ -0,0 +1,251 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: report_render.py
+Description: Renders an inventory as Markdown, HTML and JSON reports, HTML goes straight to the file
+'''
+
+import json
+from html import escape
+from i18n import _
+from inventory import DEVICE_CLASSES
+
+GB = 1024 ** 3
+MB = 1024 ** 2
+SIZE_DETAILS = {"size", "free"} # device details in bytes
+HTML_CHUNK_ROWS = 500 # table rows written at once
+
+HTML_STYLE = """
+table.sortable th { cursor: pointer; user-select: none; }
+table.sortable th[aria-sort=ascending]::after { content: " \\25B2"; }
+table.sortable th[aria-sort=descending]::after { content: " \\25BC"; }
+"""
+
+# Sorting by a column header click and filtering by the search box above every table, no libraries
+HTML_SCRIPT = """
+var collator = new Intl.Collator(undefined, {numeric: true, sensitivity: "base"});
+document.querySelectorAll("table.sortable").forEach(function (table) {
+  var headers = table.querySelectorAll("th");
+  headers.forEach(function (header, column) {
+    header.addEventListener("click", function () {
+      var ascending = header.getAttribute("aria-sort") !== "ascending";
+      headers.forEach(function (other) { other.removeAttribute("aria-sort"); });
+      header.setAttribute("aria-sort", ascending ? "ascending" : "descending");
+      var numeric = header.hasAttribute("data-numeric");
+      var body = table.tBodies[0];
+      var rows = Array.prototype.slice.call(body.rows);
+      rows.sort(function (a, b) {
+        var x = a.cells[column], y = b.cells[column];
+        var order = numeric ? x.dataset.value - y.dataset.value : collator.compare(x.textContent, y.textContent);
+        return ascending ? order : -order;
+      });
+      var sorted = document.createDocumentFragment();
+      rows.forEach(function (row) { sorted.appendChild(row); });
+      body.appendChild(sorted);
+    });
+  });
+});
+document.querySelectorAll("input[data-filter]").forEach(function (input) {
+  var rows = document.getElementById(input.dataset.filter).tBodies[0].rows;
+  input.addEventListener("input", function () {
+    var text = input.value.trim().toLowerCase();
+    Array.prototype.forEach.call(rows, function (row) {
+      row.hidden = text !== "" && row.textContent.toLowerCase().indexOf(text) < 0;
+    });
+  });
+});
+"""
+
+def device_class_title(device_class):
+  """Section title of a device class"""
+  return {
+    "cpu": "CPU",
+    "ram": "RAM",
+    "drive": _("Drives"),
+    "gpu": "GPU",
+    "network": _("Network Adapters"),
+    "printer": _("Printers"),
+    "scanner": _("Scanners"),
+  }[device_class]
+
+def detail_label(key):
+  """Label of a device detail"""
+  return {
+    "cores": _("Number of Cores"),
+    "size": _("Size"),
+    "free": _("Free"),
+    "connection_id": _("Connection ID"),
+    "type": _("Type"),
+    "port": _("Port"),
+  }[key]
+
+def detail_text(key, value):
+  """A device detail as shown in the report"""
+  if key in SIZE_DETAILS:
+    return f"{detail_label(key)}: {value / GB:.2f} GB"
+  return f"{detail_label(key)}: {value}"
+
+def device_text(device):
+  """A device with its details in one line"""
+  details = ", ".join(detail_text(key, value) for key, value in device.details.items())
+  if device.name and details:
+    return f"{device.name} - {details}"
+  return device.name or details
+
+def cell(value):
+  """Text of a Markdown table cell"""
+  return "" if value is None else str(value).replace("|", "\\|")
+
+def app_size(size):
+  """Install size as shown in the report"""
+  return "" if size is None else f"{size / MB:.1f} MB"
+
+def app_table(apps):
+  """Markdown table of applications"""
+  if not apps:
+    return []
+  lines = [
+    f"| {_('Name')} | {_('Version')} | {_('Publisher')} | {_('Size')} |",
+    "| --- | --- | --- | ---: |",
+  ]
+  lines.extend(
+    f"| {cell(app.name)} | {cell(app.version)} | {cell(app.publisher)} | {app_size(app.size)} |"
+    for app in apps
+  )
+  return lines
+
+def render_markdown(inventory):
+  """The whole report as Markdown"""
+  timestamp = inventory.generated.strftime("%Y-%m-%d %H:%M:%S")
+  lines = [f"""
+# {_('Linux Migration Toolkit Report')}
+
+*{_('Generated on')} {timestamp}*
+
+## {_('What do I do with this information?')}
+
+{_('You can use this report to')}:
+
+- {_("Check your hardware's compatibility with Linux")}.
+- {_('Find Linux alternatives for the Windows programs you currently use')}.
+
+{_('Helpful resources')}:
+
+- [Ubuntu Hardware Support Wiki](https://wiki.ubuntu.com/HardwareSupport)
+- [{_('Linux software equivalents to Windows software')}](https://wiki.linuxquestions.org/wiki/Linux_software_equivalent_to_Windows_software)
+
+## {_('Table of Contents')}
+
+- [{_('Standard Applications')}](#standard-applications) &dash; {_('these apps are installed, when you download and installation file and launch it')}
+- [{_('Microsoft Store Applications')}](#microsoft-store-applications) &dash; {_('these are the apps, installed from Microsoft Store')}
+- [{_('Hardware Information')}](#hardware-information) &dash; {_('some basic information about your system')}: CPU, GPU, RAM, HDD/SSD
+"""]
+
+  lines += [f"## {_('Standard Applications')}", ""] + app_table(inventory.standard_apps) + [""]
+  lines += [f"## {_('Microsoft Store Applications')}", ""] + app_table(inventory.store_apps) + [""]
+  lines += [f"## {_('Hardware Information')}", ""]
+  for device_class in DEVICE_CLASSES:
+    devices = inventory.devices_of(device_class)
+    lines += [f"### {device_class_title(device_class)}:", ""]
+    lines += [f"- {device_text(device)}" for device in devices]
+    if device_class in inventory.partial:
+      reason = inventory.partial[device_class] or _("Windows did not answer in time")
+      lines.append(f"- *{_('Incomplete')}: {reason}*")
+    elif not devices:
+      lines.append(f"- {_('No devices found')}")
+    lines.append("")
+  return "\n".join(lines)
+
+def html_app_table(table_id, apps):
+  """Chunks of a sortable html table of applications with its search box"""
+  yield (f'<input type="search" data-filter="{table_id}" placeholder="{escape(_("Search"))}" '
+    f'aria-label="{escape(_("Search"))}">\n'
+    f'<table class="sortable" id="{table_id}">\n<thead><tr><th>{escape(_("Name"))}</th><th>{escape(_("Version"))}</th>'
+    f'<th>{escape(_("Publisher"))}</th><th data-numeric>{escape(_("Size"))}</th></tr></thead>\n<tbody>\n')
+  for start in range(0, len(apps), HTML_CHUNK_ROWS):
+    yield "".join(
+      f'<tr><td>{escape(app.name)}</td><td>{escape(app.version or "")}</td><td>{escape(app.publisher or "")}</td>'
+      f'<td data-value="{-1 if app.size is None else app.size}">{app_size(app.size)}</td></tr>\n'
+      for app in apps[start:start + HTML_CHUNK_ROWS]
+    )
+  yield "</tbody>\n</table>\n"
+
+def html_devices(inventory):
+  """Chunks of the hardware sections"""
+  for device_class in DEVICE_CLASSES:
+    devices = inventory.devices_of(device_class)
+    items = [f"<li>{escape(device_text(device))}</li>" for device in devices]
+    if device_class in inventory.partial:
+      reason = inventory.partial[device_class] or _("Windows did not answer in time")
+      items.append(f"<li><em>{escape(_('Incomplete'))}: {escape(reason)}</em></li>")
+    elif not devices:
+      items.append(f"<li>{escape(_('No devices found'))}</li>")
+    yield (f'<h3 id="hardware-{device_class}">{escape(device_class_title(device_class))}</h3>\n'
+      f"<ul>\n{chr(10).join(items)}\n</ul>\n")
+
+def html_chunks(inventory):
+  """The whole report as a standalone html page, in chunks"""
+  title = escape(_("Linux Migration Toolkit Report"))
+  timestamp = inventory.generated.strftime("%Y-%m-%d %H:%M:%S")
+  sections = [
+    ("standard-applications", _("Standard Applications"),
+      _("these apps are installed, when you download and installation file and launch it")),
+    ("microsoft-store-applications", _("Microsoft Store Applications"), _("these are the apps, installed from Microsoft Store")),
+    ("hardware-information", _("Hardware Information"),
+      _("some basic information about your system") + ": CPU, GPU, RAM, HDD/SSD"),
+  ]
+  hardware_toc = "".join(f'<li><a href="#hardware-{device_class}">{escape(device_class_title(device_class))}</a></li>'
+    for device_class in DEVICE_CLASSES)
+  toc = "\n".join(
+    f'<li><a href="#{anchor}">{escape(heading)}</a> &dash; {escape(description)}'
+    + (f"<ul>{hardware_toc}</ul>" if anchor == "hardware-information" else "") + "</li>"
+    for anchor, heading, description in sections
+  )
+  yield f"""<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>{title}</title>
+  <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/@picocss/pico@2/css/pico.min.css">
+  <style>{HTML_STYLE}</style>
+</head>
+<body>
+<main class="container">
+<h1>{title}</h1>
+<p><em>{escape(_('Generated on'))} {timestamp}</em></p>
+<h2>{escape(_('What do I do with this information?'))}</h2>
+<p>{escape(_('You can use this report to'))}:</p>
+<ul>
+<li>{escape(_("Check your hardware's compatibility with Linux"))}.</li>
+<li>{escape(_('Find Linux alternatives for the Windows programs you currently use'))}.</li>
+</ul>
+<p>{escape(_('Helpful resources'))}:</p>
+<ul>
+<li><a href="https://wiki.ubuntu.com/HardwareSupport">Ubuntu Hardware Support Wiki</a></li>
+<li><a href="https://wiki.linuxquestions.org/wiki/Linux_software_equivalent_to_Windows_software">{escape(_('Linux software equivalents to Windows software'))}</a></li>
+</ul>
+<h2>{escape(_('Table of Contents'))}</h2>
+<ul>
+{toc}
+</ul>
+"""
+  yield f'<h2 id="standard-applications">{escape(_("Standard Applications"))}</h2>\n'
+  yield from html_app_table("standard-apps", inventory.standard_apps)
+  yield f'<h2 id="microsoft-store-applications">{escape(_("Microsoft Store Applications"))}</h2>\n'
+  yield from html_app_table("store-apps", inventory.store_apps)
+  yield f'<h2 id="hardware-information">{escape(_("Hardware Information"))}</h2>\n'
+  yield from html_devices(inventory)
+  yield f"</main>\n<script>{HTML_SCRIPT}</script>\n</body>\n</html>\n"
+
+def write_html(inventory, path):
+  """Write the html report chunk by chunk, the page is never held in memory as a whole"""
+  with open(path, "w", encoding="utf-8") as f:
+    for chunk in html_chunks(inventory):
+      f.write(chunk)
+
+def render_json(inventory):
+  """The inventory as JSON, for scripts"""
+  return json.dumps(inventory.to_dict(), ensure_ascii=False, indent=2)
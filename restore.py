@@ -0,0 +1,237 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: restore.py
+Description: Parallel restore of LMTK archives on the Linux side, with Windows-to-Linux name mapping
+'''
+
+import os
+import sys
+import json
+import queue
+import shutil
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from volumes import open_archive
+from incremental import BackupIndex, DELETED_MEMBER
+from member_codec import is_compressed, member_codec, original_name, original_size
+
+DEFAULT_THREADS = 8
+BUFFER_SIZE = 1024 * 1024 # read and write buffer per file
+MAX_NAME_BYTES = 255 # ext4, btrfs, xfs
+PORTABLE_ILLEGAL = set('<>:"|?*\\') | {chr(c) for c in range(32)} # not allowed on NTFS/exFAT/FAT mounts
+RESERVED_NAMES = {"CON", "PRN", "AUX", "NUL", *(f"COM{i}" for i in range(1, 10)), *(f"LPT{i}" for i in range(1, 10))}
+
+class NameMapper():
+  """Maps archive names to safe target paths: no escapes, valid lengths, no case collisions"""
+  def __init__(self, target, portable=False):
+    self.target = os.path.abspath(target)
+    self.portable = portable
+    self.case_insensitive = portable or self.is_case_insensitive(self.target)
+    self.assigned = {} # relative path as named in the archive -> last component used for it
+    self.taken = set() # lower-case relative paths in use
+    self.renamed = {} # archive name -> relative target path
+
+  def is_case_insensitive(self, target):
+    """Probe the target file system with a temporary file"""
+    os.makedirs(target, exist_ok=True)
+    probe = os.path.join(target, ".lmtk-case-probe")
+    try:
+      with open(probe, "w", encoding="utf-8"):
+        pass
+      return os.path.exists(probe.upper())
+    finally:
+      os.remove(probe)
+
+  def component(self, name):
+    """Make one path component valid on the target file system"""
+    if self.portable:
+      name = "".join("_" if c in PORTABLE_ILLEGAL else c for c in name).rstrip(" .") or "_"
+      if name.split(".")[0].upper() in RESERVED_NAMES:
+        name = "_" + name
+    if len(name.encode("utf-8")) > MAX_NAME_BYTES:
+      # keep the extension and make the shortened name unique with a hash of the full one
+      stem, ext = os.path.splitext(name)
+      digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+      budget = MAX_NAME_BYTES - len(ext.encode("utf-8")) - len(digest) - 1
+      stem = stem.encode("utf-8")[:budget].decode("utf-8", "ignore")
+      name = f"{stem}~{digest}{ext}"
+    return name
+
+  def map(self, arcname):
+    """Target path of an archive name, None if nothing of it is left"""
+    parts = [p for p in arcname.replace("\\", "/").split("/") if p not in ("", ".", "..")]
+    if not parts:
+      return None
+    mapped = []
+    for part in parts:
+      mapped.append(self.component(part))
+      if self.case_insensitive:
+        mapped[-1] = self.unique(mapped)
+    rel = os.path.join(*mapped)
+    if rel != os.path.join(*parts):
+      self.renamed[arcname] = rel
+    return os.path.join(self.target, rel)
+
+  def unique(self, mapped):
+    """Last component of mapped, renamed if another name already differs from it only by case"""
+    rel = os.path.join(*mapped)
+    if rel not in self.assigned:
+      stem, ext = os.path.splitext(mapped[-1])
+      name = mapped[-1]
+      number = 1
+      while os.path.join(*mapped[:-1], name).lower() in self.taken:
+        name = f"{stem} ({number}){ext}"
+        number += 1
+      self.assigned[rel] = name
+      self.taken.add(os.path.join(*mapped[:-1], name).lower())
+    return self.assigned[rel]
+
+def decompressed_chunks(chunks, codec):
+  """Decompress chunks holding one or more concatenated streams of the codec"""
+  decompressor = codec.decompressor()
+  for chunk in chunks:
+    while chunk:
+      yield decompressor.decompress(chunk)
+      chunk = b""
+      if decompressor.eof: # blocks of large files are separate streams
+        chunk = decompressor.unused_data
+        decompressor = codec.decompressor()
+
+def write_file(path, chunks, mtime, mode, semaphore, codec=None):
+  """
+  Write a file body from a queue of chunks ending with None (runs in a worker thread);
+  separately compressed files are decompressed here, so that runs in parallel too
+  """
+  received = iter(chunks.get, None)
+  try:
+    if os.path.lexists(path):
+      os.remove(path) # read-only leftovers and links are replaced, never written through
+    with open(path, "wb", buffering=BUFFER_SIZE) as f:
+      for chunk in decompressed_chunks(received, codec) if codec else received:
+        f.write(chunk)
+    os.chmod(path, (mode & 0o777) | 0o200)
+    os.utime(path, (mtime, mtime))
+  except BaseException:
+    for _ in received: # the reader blocks on the full queue until the rest of the body is taken
+      pass
+    raise
+  finally:
+    semaphore.release()
+
+class Restorer():
+  """Extracts archives with a reader thread feeding file bodies to a pool of writer threads"""
+  def __init__(self, target, threads=DEFAULT_THREADS, portable=False, workers=None):
+    self.target = os.path.abspath(target)
+    self.threads = threads
+    self.workers = workers or os.cpu_count() or 1 # processes for bz2 decompression
+    self.mapper = NameMapper(self.target, portable)
+    self.stats = {"files": 0, "dirs": 0, "links": 0, "bytes": 0, "skipped": 0}
+    self._dirs = {} # path -> mtime, set after all files are written
+
+  def restore(self, archive_path):
+    """Restore one archive (single file or split volumes, plain or compressed with any supported codec)"""
+    semaphore = threading.Semaphore(self.threads * 2) # bounds files held in memory
+    futures = []
+    with ThreadPoolExecutor(max_workers=self.threads) as pool, open_archive(archive_path, self.workers) as tar:
+      for member in tar:
+        if member.name == DELETED_MEMBER:
+          self.apply_deleted(json.loads(tar.extractfile(member).read()))
+          continue
+        path = self.mapper.map(original_name(member))
+        if path is None:
+          self.stats["skipped"] += 1
+        elif member.isdir():
+          os.makedirs(path, exist_ok=True)
+          self._dirs[path] = member.mtime
+          self.stats["dirs"] += 1
+        elif member.isfile():
+          futures.append(self.submit_file(pool, tar, member, path, semaphore))
+        elif member.issym() and self.link_is_safe(path, member.linkname):
+          os.makedirs(os.path.dirname(path), exist_ok=True)
+          if os.path.lexists(path):
+            os.remove(path)
+          os.symlink(member.linkname, path)
+          self.stats["links"] += 1
+        else:
+          self.stats["skipped"] += 1
+      for future in futures:
+        future.result() # re-raise write errors
+    return self.stats
+
+  def submit_file(self, pool, tar, member, path, semaphore):
+    """Hand a file body to a writer thread, reading it in large chunks on this thread"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    semaphore.acquire() # pylint: disable=consider-using-with
+    chunks = queue.Queue(maxsize=4)
+    codec = member_codec(member) if is_compressed(member) else None
+    future = pool.submit(write_file, path, chunks, member.mtime, member.mode, semaphore, codec)
+    source = tar.extractfile(member)
+    for chunk in iter(lambda: source.read(BUFFER_SIZE), b""):
+      chunks.put(chunk)
+    chunks.put(None)
+    self.stats["files"] += 1
+    self.stats["bytes"] += original_size(member)
+    return future
+
+  def link_is_safe(self, path, linkname):
+    """Only relative links that stay inside the target are restored"""
+    if os.path.isabs(linkname):
+      return False
+    resolved = os.path.abspath(os.path.join(os.path.dirname(path), linkname))
+    return resolved.startswith(self.target + os.sep)
+
+  def apply_deleted(self, arcnames):
+    """Remove what an incremental archive lists as deleted since the previous one"""
+    for arcname in arcnames:
+      path = self.mapper.map(arcname)
+      if path is None:
+        continue
+      if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+      elif os.path.lexists(path):
+        os.remove(path)
+
+  def finish(self):
+    """Set folder mtimes, deepest first, now that nothing is written into them anymore"""
+    for path in sorted(self._dirs, key=len, reverse=True):
+      if os.path.isdir(path):
+        os.utime(path, (self._dirs[path], self._dirs[path]))
+    return self.stats
+
+def restore_chain(destination, target, threads=DEFAULT_THREADS, portable=False):
+  """Restore the full archive of an incremental chain and then each incremental in order"""
+  restorer = Restorer(target, threads, portable)
+  for link in BackupIndex(destination).load().chain:
+    restorer.restore(os.path.join(destination, link["archive"]))
+  return restorer
+
+def main(argv=None):
+  """Command line: python restore.py ARCHIVE TARGET"""
+  parser = argparse.ArgumentParser(description="Restore an LMTK backup archive with parallel writers")
+  parser.add_argument("archive", help="archive file, its first volume, or with --chain the backup folder")
+  parser.add_argument("target", help="folder to restore into")
+  parser.add_argument("-j", "--threads", type=int, default=DEFAULT_THREADS, help="writer threads")
+  parser.add_argument("--portable-names", action="store_true",
+    help="also replace characters NTFS/exFAT/FAT mounts do not allow and treat names case-insensitively")
+  parser.add_argument("--chain", action="store_true", help="restore the whole incremental chain of a backup folder")
+  args = parser.parse_args(argv)
+
+  if args.chain:
+    restorer = restore_chain(args.archive, args.target, args.threads, args.portable_names)
+  else:
+    restorer = Restorer(args.target, args.threads, args.portable_names)
+    restorer.restore(args.archive)
+  stats = restorer.finish()
+  for arcname, rel in restorer.mapper.renamed.items():
+    print(f"renamed: {arcname} -> {rel}")
+  print(f"{stats['files']} files, {stats['dirs']} folders, {stats['bytes']} bytes restored, {stats['skipped']} skipped")
+  return 0
+
+if __name__ == "__main__":
+  sys.exit(main())
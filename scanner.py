@@ -0,0 +1,148 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: scanner.py
+Description: Single-pass os.scandir traversal that builds the file manifest used for sizing and archiving
+'''
+
+import os
+import stat
+import time
+from collections import namedtuple
+
+# rel is relative to the manifest root, "" is the root itself
+FileEntry = namedtuple("FileEntry", ["rel", "type", "size", "mtime", "mode"])
+TYPE_FILE = "f"
+TYPE_DIR = "d"
+TYPE_LINK = "l"
+
+class Manifest():
+  """Files, folders and links of one source folder with their size, mtime and mode"""
+  def __init__(self, root, arcname):
+    self.root = root
+    self.arcname = arcname
+    self.entries = []
+    self.total_size = 0
+    self.errors = [] # (path, OSError) for unreadable folders
+    self.complete = True # False if the scan was cancelled
+    self.rules = None # signature of the exclusion rules it was scanned with
+    self.excluded = 0 # entries left out by exclusion rules, an excluded folder counts once
+    self.excluded_size = 0 # size of excluded files, not counting the content of excluded folders
+
+  def path(self, rel):
+    """Absolute path of a relative manifest path"""
+    return os.path.join(self.root, rel) if rel else self.root
+
+  def arcname_of(self, rel):
+    """Name of a relative manifest path inside the archive, always with forward slashes"""
+    if not rel:
+      return self.arcname
+    return f"{self.arcname}/{rel.replace(os.sep, '/')}"
+
+  def tree(self):
+    """Children of every folder for Scanner.scan(previous=...)"""
+    tree = {entry.rel: (entry.mtime, []) for entry in self.entries if entry.type == TYPE_DIR}
+    for entry in self.entries:
+      if entry.rel:
+        parent = tree.get(os.path.dirname(entry.rel))
+        if parent is not None:
+          parent[1].append(entry)
+    return tree
+
+class Scanner():
+  """Walks a folder once with os.scandir, reusing the stat data the directory listing already has"""
+  def scan(self, root, arcname, previous=None, matcher=None, on_progress=None, cancel=None, interval=0.25):
+    """
+    Build a manifest of a folder, children are sorted by name, parents come before their content
+    previous maps a relative folder to (mtime, children) from an earlier scan: a folder with the
+    same mtime has the same children, so it is not listed again, but its children are still stat'ed
+    since editing a file in place does not change the mtime of its folder
+    entries the exclusion matcher rejects are left out, excluded folders are not descended into
+    on_progress(manifest) is called with the partial manifest every interval seconds,
+    setting the cancel event stops the scan and leaves an incomplete manifest
+    """
+    manifest = Manifest(root, arcname)
+    manifest.rules = matcher.signature if matcher is not None else None
+    try:
+      st = os.stat(root)
+    except OSError as e:
+      manifest.errors.append((root, e))
+      return manifest
+    manifest.entries.append(FileEntry("", TYPE_DIR, 0, st.st_mtime, st.st_mode))
+
+    stack = [("", st.st_mtime)]
+    last_report = time.monotonic()
+    while stack:
+      if cancel is not None and cancel.is_set():
+        manifest.complete = False
+        break
+      if on_progress is not None and time.monotonic() - last_report >= interval:
+        last_report = time.monotonic()
+        on_progress(manifest)
+      rel_dir, dir_mtime = stack.pop()
+      known = previous.get(rel_dir) if previous else None
+      if known is not None and known[0] == dir_mtime:
+        children = [(entry, None) for entry in self.reuse_children(manifest, known[1])]
+      else:
+        try:
+          with os.scandir(manifest.path(rel_dir)) as it:
+            children = [(self.scan_entry(child, os.path.join(rel_dir, child.name) if rel_dir else child.name), child)
+                        for child in sorted(it, key=lambda e: e.name)]
+        except OSError as e:
+          manifest.errors.append((manifest.path(rel_dir), e))
+          continue
+
+      subdirs = []
+      for entry, dir_entry in children:
+        if entry is None:
+          continue
+        if matcher is not None and matcher.excludes(entry, self.file_attributes(dir_entry)):
+          manifest.excluded += 1
+          manifest.excluded_size += entry.size
+          continue
+        manifest.entries.append(entry)
+        manifest.total_size += entry.size
+        if entry.type == TYPE_DIR:
+          subdirs.append((entry.rel, entry.mtime))
+      stack.extend(reversed(subdirs))
+    return manifest
+
+  def reuse_children(self, manifest, children):
+    """Children of an unchanged folder with fresh size, mtime and mode, vanished ones are left out"""
+    result = []
+    for entry in children:
+      try:
+        st = os.lstat(manifest.path(entry.rel))
+      except OSError:
+        continue
+      size = st.st_size if entry.type == TYPE_FILE else 0
+      result.append(entry._replace(size=size, mtime=st.st_mtime, mode=st.st_mode))
+    return result
+
+  def scan_entry(self, child, rel):
+    """Turn a DirEntry into a manifest entry, None for junctions, sockets, devices and vanished files"""
+    if getattr(child, "is_junction", lambda: False)(): # Windows junctions point back into the profile
+      return None
+    try:
+      st = child.stat(follow_symlinks=False)
+    except OSError:
+      return None
+    if stat.S_ISLNK(st.st_mode):
+      return FileEntry(rel, TYPE_LINK, 0, st.st_mtime, st.st_mode)
+    if stat.S_ISDIR(st.st_mode):
+      return FileEntry(rel, TYPE_DIR, 0, st.st_mtime, st.st_mode)
+    if stat.S_ISREG(st.st_mode):
+      return FileEntry(rel, TYPE_FILE, st.st_size, st.st_mtime, st.st_mode)
+    return None
+
+  def file_attributes(self, dir_entry):
+    """Windows file attributes from the cached stat of a DirEntry, 0 elsewhere"""
+    if dir_entry is None:
+      return 0
+    try:
+      return getattr(dir_entry.stat(follow_symlinks=False), "st_file_attributes", 0)
+    except OSError:
+      return 0
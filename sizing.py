@@ -0,0 +1,57 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: sizing.py
+Description: Sizes source folders on background threads, with a per-folder cache invalidated by mtime
+'''
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SIZING_WORKERS = 2 # folders are usually on the same disk, more threads only add seeks
+
+class FolderSizer():
+  """
+  Scans folders off the UI thread; the manifests of finished scans are kept, so sizing a folder again
+  only stats its subfolders and lists the ones whose mtime changed
+  """
+  def __init__(self, scanner, workers=SIZING_WORKERS):
+    self.scanner = scanner
+    self.cache = {} # root -> last complete Manifest
+    self._lock = threading.Lock()
+    self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sizing")
+
+  def size(self, root, arcname, matcher=None, on_progress=None, on_done=None):
+    """
+    Start sizing a folder with the given exclusion matcher, return an event that cancels it
+    on_progress(manifest) gets partial results, on_done(manifest) the complete one; both run on a worker thread
+    """
+    cancel = threading.Event()
+    self._pool.submit(self._run, os.path.normpath(root), arcname, matcher, on_progress, on_done, cancel)
+    return cancel
+
+  def cached(self, root):
+    """Last complete manifest of a folder, it may be stale"""
+    with self._lock:
+      return self.cache.get(os.path.normpath(root))
+
+  def _run(self, root, arcname, matcher, on_progress, on_done, cancel):
+    """Scan a folder reusing the cached tree, keep and report the result unless cancelled"""
+    if cancel.is_set():
+      return
+    known = self.cached(root)
+    rules = matcher.signature if matcher is not None else None
+    # a tree scanned with other rules may lack entries these rules keep
+    reusable = known is not None and known.arcname == arcname and known.rules == rules
+    previous = known.tree() if reusable else None
+    manifest = self.scanner.scan(root, arcname, previous, matcher, on_progress, cancel)
+    if not manifest.complete:
+      return
+    with self._lock:
+      self.cache[root] = manifest
+    if on_done is not None:
+      on_done(manifest)
@@ -0,0 +1,33 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: startup.py
+Description: Startup timing breakdown, printed to the console when LMTK_STARTUP_TIMING is set
+'''
+
+import os
+import sys
+import time
+
+STARTED = time.perf_counter() # dialog.py imports this module first
+TIMING_VARIABLE = "LMTK_STARTUP_TIMING"
+marks = [] # (step, perf_counter at its end)
+
+def mark(step):
+  """Note that a startup step has finished"""
+  marks.append((step, time.perf_counter()))
+
+def report(stream=None):
+  """Print how long every step took and the time to the home window, if asked for"""
+  if not os.environ.get(TIMING_VARIABLE):
+    return
+  stream = stream or sys.stderr
+  previous = STARTED
+  for step, at in marks:
+    stream.write(f"{step:<28}{(at - previous) * 1000:8.1f} ms\n")
+    previous = at
+  stream.write(f"{'total':<28}{(previous - STARTED) * 1000:8.1f} ms\n")
+  stream.flush()
@@ -0,0 +1,116 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: throttle.py
+Description: Pause, resume, cancel and bandwidth limit of a running backup, low-priority mode
+'''
+
+import os
+import time
+import signal
+import threading
+
+WAIT_SLICE = 0.1 # seconds, longest sleep between checks for cancel
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000 # low CPU and I/O priority for one thread
+PROCESS_MODE_BACKGROUND_BEGIN = 0x00100000 # the same for a whole process
+
+class BackupCancelled(Exception):
+  """Raised in the backup thread when the user cancels"""
+
+class BackupControl():
+  """Shared between the UI and the backup thread, which calls check() between read chunks"""
+  def __init__(self, bandwidth_limit=0):
+    self.bandwidth_limit = bandwidth_limit # bytes per second, 0 - no limit
+    self.cancelled = threading.Event()
+    self._running = threading.Event()
+    self._running.set()
+    self._window_start = time.monotonic()
+    self._window_bytes = 0
+
+  @property
+  def paused(self):
+    """Check if the backup is paused"""
+    return not self._running.is_set()
+
+  def pause(self):
+    """Stop at the next read chunk"""
+    self._running.clear()
+
+  def resume(self):
+    """Continue a paused backup"""
+    self._running.set()
+
+  def cancel(self):
+    """Stop the backup for good, the backup thread cleans up"""
+    self.cancelled.set()
+    self._running.set()
+
+  def check(self, count=0):
+    """Account for count bytes read; wait while paused or over the limit, raise if cancelled"""
+    if self.cancelled.is_set():
+      raise BackupCancelled()
+    if not self._running.is_set():
+      self._running.wait() # cancel() sets it too
+      if self.cancelled.is_set():
+        raise BackupCancelled()
+      self._window_start = time.monotonic() # the pause does not count as unused bandwidth
+      self._window_bytes = 0
+    if self.bandwidth_limit and count:
+      self._window_bytes += count
+      while True:
+        ahead = self._window_bytes / self.bandwidth_limit - (time.monotonic() - self._window_start)
+        if ahead <= 0:
+          break
+        if self.cancelled.wait(min(ahead, WAIT_SLICE)):
+          raise BackupCancelled()
+      if time.monotonic() - self._window_start > 1:
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+
+class ControlledReader():
+  """Read-only file wrapper that hands every read to a BackupControl"""
+  def __init__(self, fileobj, control):
+    self.fileobj = fileobj
+    self.control = control
+
+  def read(self, size=-1):
+    """Read, then wait or stop as the control says"""
+    data = self.fileobj.read(size)
+    self.control.check(len(data))
+    return data
+
+def lower_thread_priority():
+  """Background CPU and I/O priority for the calling thread"""
+  try:
+    if os.name == "nt":
+      import ctypes # pylint: disable=import-outside-toplevel
+      kernel32 = ctypes.windll.kernel32
+      kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN)
+    else:
+      os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19) # per thread on Linux
+  except (OSError, AttributeError):
+    pass
+
+def lower_process_priority():
+  """Background priority for a whole worker process, used as a pool initializer"""
+  try:
+    if os.name == "nt":
+      import ctypes # pylint: disable=import-outside-toplevel
+      kernel32 = ctypes.windll.kernel32
+      kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), PROCESS_MODE_BACKGROUND_BEGIN)
+    else:
+      os.nice(19)
+  except (OSError, AttributeError):
+    pass
+
+def ignore_interrupts():
+  """Pool initializer: Ctrl+C reaches the whole console, only the backup thread reacts by cancelling"""
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def background_worker():
+  """Pool initializer for low-priority mode"""
+  ignore_interrupts()
+  lower_process_priority()
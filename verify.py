@@ -0,0 +1,57 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: verify.py
+Description: Checks an archive against the SHA-256 manifest written while it was created
+'''
+
+import os
+import hashlib
+import functools
+from volumes import open_archive
+from member_codec import original_name, open_member
+
+CHECKSUM_SUFFIX = ".sha256" # backup_<ts>.tar.bz2.sha256, in sha256sum format
+READ_SIZE = 1024 * 1024
+
+def load_checksums(path):
+  """Read a sha256sum-style file into {arcname: hexdigest}, a later line wins like a later tar member"""
+  checksums = {}
+  with open(path, "r", encoding="utf-8") as f:
+    for line in f:
+      line = line.rstrip("\n")
+      if line:
+        digest, name = line.split("  ", 1)
+        checksums[name] = digest
+  return checksums
+
+def verify_archive(archive_path, checksum_path=None, workers=None):
+  """
+  Re-read an archive and compare every file with the manifest;
+  bz2 archives are decompressed on several processes
+  """
+  checksum_path = checksum_path or archive_path + CHECKSUM_SUFFIX
+  expected = load_checksums(checksum_path)
+  actual = {}
+  with open_archive(archive_path, workers or os.cpu_count() or 1) as tar:
+    for member in tar:
+      name = original_name(member)
+      if not member.isfile() or name not in expected:
+        continue
+      sha256 = hashlib.sha256()
+      with open_member(tar, member) as f:
+        for data in iter(functools.partial(f.read, READ_SIZE), b""):
+          sha256.update(data)
+      actual[name] = sha256.hexdigest()
+  mismatched = sorted(name for name, digest in actual.items() if expected[name] != digest)
+  missing = sorted(name for name in expected if name not in actual)
+  return {
+    "files": len(expected),
+    "verified": len(actual) - len(mismatched),
+    "mismatched": mismatched,
+    "missing": missing,
+    "ok": not mismatched and not missing,
+  }
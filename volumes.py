@@ -0,0 +1,193 @@
+# LMTK creates report about hardware and software in windows, backs up data and displays info about creating installation media
+# Copyright (C) 2025 Konstantin Ovchinnikov k@kovchinnikov.info
+# This file is part of LMTK, licensed under the GNU GPLv3 or later.
+# See the LICENSE file or <https://www.gnu.org/licenses/> for details.
+
+'''
+Module: volumes.py
+Description: Streaming multi-volume output (archive.001, .002, ...) and reading the volumes back as one stream
+'''
+
+import os
+import re
+import tarfile
+import contextlib
+from compression import decompressed_reader, ParallelBz2Reader, codec_for_magic, MAGIC_SIZE
+from member_codec import extract_member
+
+FAT32_VOLUME_SIZE = 4 * 1024 ** 3 - 1 # largest file FAT32 can hold
+_VOLUME_SUFFIX = re.compile(r"\.\d{3}$")
+
+def volume_path(base_path, number):
+  """Name of the volume with the given number, starting at 1"""
+  return f"{base_path}.{number:03d}"
+
+class VolumeWriter():
+  """Write-only file object that rolls over to the next volume file every volume_size bytes"""
+  def __init__(self, base_path, volume_size, start_position=0):
+    self.base_path = base_path
+    self.volume_size = volume_size
+    self.paths = []
+    self.closed = False
+    self._file = None
+    self._in_volume = 0 # bytes in the current volume
+    self._position = 0
+    if start_position:
+      self._resume(start_position)
+
+  def _resume(self, position):
+    """Continue an interrupted archive: cut it after position and drop the volumes behind it"""
+    count = -(-position // self.volume_size) # volumes holding the first position bytes
+    for number in range(count + 1, len(find_volumes(self.base_path)) + 1):
+      os.remove(volume_path(self.base_path, number))
+    self.paths = [volume_path(self.base_path, number) for number in range(1, count + 1)]
+    self._in_volume = position - (count - 1) * self.volume_size
+    self._file = open(self.paths[-1], "r+b") # pylint: disable=consider-using-with
+    self._file.truncate(self._in_volume)
+    self._file.seek(self._in_volume)
+    self._position = position
+
+  def _next_volume(self):
+    """Close the full volume and start the next one"""
+    if self._file is not None:
+      self._file.close()
+    path = volume_path(self.base_path, len(self.paths) + 1)
+    self._file = open(path, "wb") # pylint: disable=consider-using-with
+    self.paths.append(path)
+    self._in_volume = 0
+
+  def write(self, data):
+    """Write data, splitting it over as many volumes as needed"""
+    view = memoryview(data).cast("B")
+    while view:
+      if self._file is None or self._in_volume >= self.volume_size:
+        self._next_volume()
+      count = min(len(view), self.volume_size - self._in_volume)
+      self._file.write(view[:count])
+      self._in_volume += count
+      self._position += count
+      view = view[count:]
+    return len(data)
+
+  def tell(self):
+    """Bytes written over all volumes"""
+    return self._position
+
+  def flush(self):
+    """Flush the current volume"""
+    if self._file is not None:
+      self._file.flush()
+
+  def fileno(self):
+    """Descriptor of the current volume, for os.fsync"""
+    if self._file is None:
+      self._next_volume()
+    return self._file.fileno()
+
+  def close(self):
+    """Close the last volume, an empty archive still gets its first volume"""
+    if self.closed:
+      return
+    if self._file is None:
+      self._next_volume()
+    self._file.close()
+    self.closed = True
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.close()
+
+class VolumeReader():
+  """Read-only file object that streams a list of volumes in order"""
+  def __init__(self, paths):
+    self.paths = list(paths)
+    self._index = 0
+    self._file = None
+
+  def read(self, size=-1):
+    """Read up to size bytes, crossing volume boundaries"""
+    chunks = []
+    while size != 0 and self._index < len(self.paths):
+      if self._file is None:
+        self._file = open(self.paths[self._index], "rb") # pylint: disable=consider-using-with
+      data = self._file.read(size)
+      if not data:
+        self._file.close()
+        self._file = None
+        self._index += 1
+        continue
+      chunks.append(data)
+      if size > 0:
+        size -= len(data)
+    return b"".join(chunks)
+
+  def seekable(self):
+    """Volumes are regular files"""
+    return True
+
+  def seek(self, offset):
+    """Move to an offset of the joined stream"""
+    position = offset
+    self.close()
+    self._index = 0
+    for path in self.paths:
+      size = os.path.getsize(path)
+      if offset < size:
+        self._file = open(path, "rb") # pylint: disable=consider-using-with
+        self._file.seek(offset)
+        break
+      offset -= size
+      self._index += 1
+    return position
+
+  def close(self):
+    """Close the open volume"""
+    if self._file is not None:
+      self._file.close()
+      self._file = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    self.close()
+
+def find_volumes(path):
+  """Volumes of a split archive, given its base name or any of its volumes; [] if it is not split"""
+  base_path = _VOLUME_SUFFIX.sub("", path)
+  paths = []
+  while os.path.exists(volume_path(base_path, len(paths) + 1)):
+    paths.append(volume_path(base_path, len(paths) + 1))
+  return paths
+
+@contextlib.contextmanager
+def open_archive(path, workers=1):
+  """
+  Open a single-file or split archive for sequential reading with any supported compression;
+  with more than one worker, bz2 streams are decompressed in parallel
+  """
+  paths = find_volumes(path)
+  if not paths or (os.path.isfile(path) and not _VOLUME_SUFFIX.search(path)):
+    paths = [path]
+  with open(paths[0], "rb") as f:
+    magic = f.read(MAGIC_SIZE)
+  codec = codec_for_magic(magic)
+  if len(paths) == 1 and (codec is None or (codec.name == "bz2" and workers <= 1)):
+    with tarfile.open(paths[0], "r:*") as tar:
+      yield tar
+  elif workers > 1 and codec is not None and codec.name == "bz2":
+    with VolumeReader(paths) as reader, ParallelBz2Reader(reader, workers) as decompressed, \
+        tarfile.open(fileobj=decompressed, mode="r|") as tar:
+      yield tar
+  else:
+    with VolumeReader(paths) as reader, \
+        tarfile.open(fileobj=decompressed_reader(reader, magic), mode="r|") as tar:
+      yield tar
+
+def extract_volumes(path, target):
+  """Stream-extract a split or single-file archive into target"""
+  with open_archive(path) as tar:
+    for member in tar:
+      extract_member(tar, member, target)